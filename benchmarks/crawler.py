@@ -0,0 +1,70 @@
+"""로컬 HTTP 서버를 상대로 SiteGPT crawler 의 처리량(pages/sec)을 잽니다.
+
+    python benchmarks/crawler.py
+"""
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from utils import crawl_store
+from utils.crawl_store import crawl_site
+from utils.html_text import extract_text
+
+PAGES = 100
+LATENCY = 0.05  # 페이지 하나를 응답하는 데 걸리는 시간(초)
+TARGET_PAGES_PER_SECOND = 20
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/robots.txt":
+            body = b"User-agent: *\nAllow: /\n"
+        elif self.path == "/sitemap.xml":
+            urls = "".join(
+                f"<url><loc>{base_url}/docs/{i}</loc><lastmod>2024-01-01</lastmod></url>"
+                for i in range(PAGES)
+            )
+            body = f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'.encode()
+        else:
+            time.sleep(LATENCY)
+            body = f"<html><body><nav>menu</nav><p>{self.path} ".encode() + b"text " * 500 + b"</p></body></html>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_port}"
+crawl_store.CRAWL_DIR = "./.cache/bench_crawl"
+
+splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=200)
+for concurrency, rps in [(1, 1000), (5, 100), (10, 200)]:
+    start = time.perf_counter()
+    store, changed, _ = crawl_site(
+        f"{base_url}/sitemap.xml",
+        [r".*/docs/.*"],
+        extract_text,
+        splitter,
+        concurrency_per_host=concurrency,
+        requests_per_second=rps,
+    )
+    elapsed = time.perf_counter() - start
+    pages_per_second = len(changed) / elapsed
+    status = "ok" if pages_per_second >= TARGET_PAGES_PER_SECOND else "below target"
+    print(
+        f"concurrency={concurrency:>2} rps={rps:>4}: {len(changed)} pages in {elapsed:.2f}s "
+        f"({pages_per_second:.1f} pages/sec, {status})"
+    )
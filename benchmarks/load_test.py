@@ -0,0 +1,551 @@
+"""여러 세션이 동시에 앱을 쓰는 상황을 흉내 내는 부하 테스트입니다.
+
+`streamlit run app.py` 를 띄우고 브라우저 대신 websocket client 로 N 개의 세션을
+동시에 붙여 각 페이지의 흐름을 실행합니다.
+
+- DocumentGPT: 파일 업로드 후 질문 두 개
+- QuizGPT: Wikipedia 검색으로 퀴즈를 만들고 답을 골라 채점
+- SiteGPT: 사이트 질문
+- Assistant: research 질문
+
+OpenAI, Wikipedia, 사이트는 모두 로컬 mock 서버가 대신하므로 네트워크 호출이나
+비용이 없습니다. 세션 수를 늘려 가며 처리량, rerun 지연 시간 분포, 세션 당 CPU 와
+메모리를 출력합니다.
+
+    python benchmarks/load_test.py --sessions 1 2 4 8 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import numpy as np
+import psutil
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "sk-load-test"
+EMBEDDING_DIM = 1536
+SITE_PAGES = 20
+RERUN_TIMEOUT = 120
+WIDGET_TYPES = {
+    "text_input",
+    "chat_input",
+    "file_uploader",
+    "selectbox",
+    "number_input",
+    "radio",
+    "button",
+}
+
+QUIZ_JSON = json.dumps(
+    {
+        "questions": [
+            {
+                "question": f"Mock question {i}? ({level})",
+                "answers": [
+                    {"answer": f"Option {j}", "correct": j == i % 4} for j in range(4)
+                ],
+                "level": level,
+            }
+            for i in range(10)
+            for level in [("Hard", "Easy")[i % 2]]
+        ]
+    }
+)
+
+
+def mock_answer(body):
+    # prompt 에 맞는 모양의 답을 돌려줘야 페이지의 parser 가 실패하지 않습니다.
+    prompt = json.dumps(body.get("messages", []))
+    if "formatting algorithm" in prompt:
+        return f"```json\n{QUIZ_JSON}\n```"
+    if "give a score" in prompt:
+        return "Answer: This is a mock answer.\nScore: 5"
+    return "This is a mock answer from the load test server. " * 4
+
+
+def mock_embedding(item):
+    vector = np.random.RandomState(zlib.crc32(json.dumps(item).encode())).standard_normal(
+        EMBEDDING_DIM
+    )
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """OpenAI API, MediaWiki API, sitemap 사이트를 한 서버에서 흉내 냅니다."""
+
+    protocol_version = "HTTP/1.1"
+    llm_latency = 0.5
+
+    def send_body(self, body, content_type="application/json", status=200):
+        body = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        host = f"http://{self.headers['Host']}"
+        if url.path == "/v1/models":
+            self.send_body(json.dumps({"object": "list", "data": []}))
+        elif url.path == "/w/api.php":
+            self.send_body(json.dumps(self.wikipedia(parse_qs(url.query))))
+        elif url.path == "/sitemap.xml":
+            urls = "".join(
+                f"<url><loc>{host}/workers-ai/page-{i}</loc><lastmod>2024-01-01</lastmod></url>"
+                for i in range(SITE_PAGES)
+            )
+            self.send_body(
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>',
+                "application/xml",
+            )
+        elif url.path.startswith("/workers-ai/"):
+            paragraphs = "".join(
+                f"<p>Workers AI mock page {url.path} paragraph {i} about models and inference.</p>"
+                for i in range(40)
+            )
+            self.send_body(f"<html><body><main>{paragraphs}</main></body></html>", "text/html")
+        else:
+            self.send_body("not found", "text/plain", 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        if self.path.endswith("/embeddings"):
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            data = [
+                {"object": "embedding", "index": i, "embedding": mock_embedding(item)}
+                for i, item in enumerate(inputs)
+            ]
+            self.send_body(
+                json.dumps(
+                    {"object": "list", "data": data, "model": body["model"], "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+                )
+            )
+            return
+        time.sleep(self.llm_latency)
+        answer = mock_answer(body)
+        if not body.get("stream"):
+            self.send_body(
+                json.dumps(
+                    {
+                        "id": "mock",
+                        "object": "chat.completion",
+                        "model": body["model"],
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": answer},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    }
+                )
+            )
+            return
+        chunks = [answer[i : i + 16] for i in range(0, len(answer), 16)]
+        events = [
+            {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+            }
+            for chunk in chunks
+        ]
+        events[-1]["choices"][0]["finish_reason"] = "stop"
+        stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+        self.send_body(stream + "data: [DONE]\n\n", "text/event-stream")
+
+    def wikipedia(self, params):
+        if "gsrsearch" in params:
+            term = params["gsrsearch"][0]
+            return {
+                "query": {
+                    "pages": {
+                        str(1000 + i): {
+                            "pageid": 1000 + i,
+                            "title": f"{term} {i}",
+                            "lastrevid": 1,
+                            "index": i,
+                        }
+                        for i in range(int(params["gsrlimit"][0]))
+                    }
+                }
+            }
+        pageid = params["pageids"][0]
+        return {
+            "query": {
+                "pages": {pageid: {"extract": f"Mock Wikipedia article {pageid}. " * 50}}
+            }
+        }
+
+    def log_message(self, *args):
+        pass
+
+
+class Session:
+    """브라우저 탭 하나처럼 websocket 으로 rerun 을 보내고 결과를 받는 client 입니다."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.widgets = []
+        self.widget_states = {}
+        self.session_id = None
+        self.page_name = ""
+        self.messages = {}
+        self.errors = []
+        self.latencies = []
+        self.finished = None
+        self.file_urls = {}
+        self.next_file_id = 0
+
+    async def open(self, page_name):
+        self.page_name = page_name
+        self.websocket = await websockets.connect(
+            self.base_url.replace("http", "ws") + "/_stcore/stream",
+            max_size=None,
+        )
+        self.receiver = asyncio.create_task(self.receive())
+        await self.rerun()
+
+    async def close(self):
+        self.receiver.cancel()
+        await self.websocket.close()
+
+    async def receive(self):
+        async for data in self.websocket:
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            if msg.hash:
+                self.messages[msg.hash] = msg
+            if msg.WhichOneof("type") == "ref_hash":
+                msg = self.messages.get(msg.ref_hash) or await self.fetch_message(msg.ref_hash)
+            self.handle(msg)
+
+    async def fetch_message(self, ref_hash):
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{self.base_url}/_stcore/message", params={"hash": ref_hash})
+        msg = ForwardMsg()
+        msg.ParseFromString(response.content)
+        return msg
+
+    def handle(self, msg):
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            self.session_id = msg.new_session.initialize.session_id
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            element = msg.delta.new_element
+            element_type = element.WhichOneof("type")
+            if element_type in WIDGET_TYPES:
+                widget = getattr(element, element_type)
+                self.widgets.append((element_type, widget.label, widget.id))
+            elif element_type == "exception":
+                self.errors.append(f"{self.page_name}: {element.exception.message}")
+        elif kind == "file_urls_response":
+            self.file_urls[msg.file_urls_response.response_id].set_result(
+                msg.file_urls_response.file_urls[0]
+            )
+        elif kind == "script_finished" and self.finished is not None:
+            if msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                self.finished.set_result(msg.script_finished)
+
+    async def rerun(self):
+        self.widgets = []
+        self.finished = asyncio.get_running_loop().create_future()
+        msg = BackMsg()
+        msg.rerun_script.page_name = self.page_name
+        msg.rerun_script.widget_states.widgets.extend(self.widget_states.values())
+        started = time.perf_counter()
+        await self.websocket.send(msg.SerializeToString())
+        status = await asyncio.wait_for(self.finished, RERUN_TIMEOUT)
+        self.latencies.append(time.perf_counter() - started)
+        # button 과 chat_input 값은 한 번의 rerun 에만 전달됩니다.
+        for widget_id, state in list(self.widget_states.items()):
+            if state.WhichOneof("value") in ("trigger_value", "string_trigger_value"):
+                del self.widget_states[widget_id]
+        if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+            self.errors.append(f"{self.page_name}: compile error")
+
+    def find(self, element_type, label):
+        ids = [id for type, text, id in self.widgets if type == element_type and text == label]
+        if not ids:
+            raise LookupError(f"{self.page_name}: no {element_type} labelled {label!r}")
+        return ids
+
+    def state(self, widget_id):
+        self.widget_states[widget_id] = BackMsg().rerun_script.widget_states.widgets.add()
+        self.widget_states[widget_id].id = widget_id
+        return self.widget_states[widget_id]
+
+    def set_text(self, label, value, element_type="text_input"):
+        self.state(self.find(element_type, label)[0]).string_value = value
+
+    def set_index(self, label, index, element_type="selectbox"):
+        for widget_id in self.find(element_type, label):
+            self.state(widget_id).int_value = index
+
+    def chat(self, label, message):
+        self.state(self.find("chat_input", label)[0]).string_trigger_value.data = message
+
+    def click(self, label):
+        self.state(self.find("button", label)[0]).trigger_value = True
+
+    async def upload(self, label, name, data):
+        widget_id = self.find("file_uploader", label)[0]
+        request_id = f"{self.session_id}-{self.next_file_id}"
+        self.file_urls[request_id] = asyncio.get_running_loop().create_future()
+        msg = BackMsg()
+        msg.file_urls_request.request_id = request_id
+        msg.file_urls_request.session_id = self.session_id
+        msg.file_urls_request.file_names.append(name)
+        await self.websocket.send(msg.SerializeToString())
+        file_urls = await asyncio.wait_for(self.file_urls[request_id], RERUN_TIMEOUT)
+        del self.file_urls[request_id]
+        async with httpx.AsyncClient() as client:
+            response = await client.put(
+                self.base_url + file_urls.upload_url,
+                files={"file": (name, data, "text/plain")},
+            )
+            response.raise_for_status()
+        self.next_file_id += 1
+        uploader = self.state(widget_id).file_uploader_state_value
+        uploader.max_file_id = self.next_file_id
+        info = uploader.uploaded_file_info.add()
+        info.id = self.next_file_id
+        info.name = name
+        info.size = len(data)
+        info.file_id = file_urls.file_id
+        info.file_urls.CopyFrom(file_urls)
+
+
+async def document_flow(session, index):
+    await session.open("DocumentGPT")
+    session.set_text("Please Enter Your OpenAI API Key", API_KEY)
+    await session.rerun()
+    # 세션마다 다른 파일을 올려 embedding cache 에 걸리지 않게 합니다.
+    document = "\n\n".join(
+        f"Session {index} document paragraph {i} about load testing streamlit apps."
+        for i in range(200)
+    )
+    await session.upload("Upload a .txt .pdf or .docx file", f"load-{index}.txt", document.encode())
+    await session.rerun()
+    for question in ("What is this document about?", "Summarise paragraph 3."):
+        session.chat("Ask anything about your file...", question)
+        await session.rerun()
+
+
+async def quiz_flow(session, index):
+    await session.open("QuizGPT")
+    session.set_text("Enter your openAI API-KEY", API_KEY)
+    await session.rerun()
+    session.set_index("Choice Options", 1)
+    await session.rerun()
+    session.set_text("Enter the keyword you want to search", f"Load testing {index}")
+    await session.rerun()
+    session.set_index("Select an option.", 0, element_type="radio")
+    session.click("Submit")
+    await session.rerun()
+
+
+async def site_flow(session, index):
+    await session.open("SiteGPT")
+    session.set_text("Enter your openAI API-KEY", API_KEY)
+    await session.rerun()
+    session.set_text("해당 웹사이트에 대해 물어보세요.", f"How do I run model {index} on Workers AI?")
+    await session.rerun()
+
+
+async def assistant_flow(session, index):
+    await session.open("Assistant")
+    session.set_text("Enter your OpenAI API key", API_KEY)
+    await session.rerun()
+    session.set_text("Enter the query you want to research", f"Research topic {index}")
+    await session.rerun()
+
+
+FLOWS = {
+    "DocumentGPT": document_flow,
+    "QuizGPT": quiz_flow,
+    "SiteGPT": site_flow,
+    "Assistant": assistant_flow,
+}
+
+
+async def run_session(base_url, flow, index):
+    session = Session(base_url)
+    try:
+        await flow(session, index)
+    except Exception as e:
+        session.errors.append(f"{session.page_name}: {type(e).__name__}: {e}")
+    finally:
+        if hasattr(session, "websocket"):
+            await session.close()
+    return session
+
+
+async def run_level(base_url, process, sessions, flows):
+    # 세션마다 페이지를 돌아가며 배정해 모든 페이지가 같은 부하를 받게 합니다.
+    names = list(flows)
+    cpu_before = process.cpu_times()
+    rss_before = process.memory_info().rss
+    peak = [rss_before]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(0.2):
+            peak[0] = max(peak[0], process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            run_session(base_url, flows[names[i % len(names)]], f"{sessions}-{i}")
+            for i in range(sessions)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+    cpu_after = process.cpu_times()
+    cpu = (cpu_after.user + cpu_after.system) - (cpu_before.user + cpu_before.system)
+    latencies = sorted(latency for session in results for latency in session.latencies)
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "reruns/s": len(latencies) / elapsed,
+        "p50 (s)": percentile(latencies, 50),
+        "p95 (s)": percentile(latencies, 95),
+        "p99 (s)": percentile(latencies, 99),
+        "cpu/session (s)": cpu / sessions,
+        "cpu (%)": cpu / elapsed * 100,
+        "peak MB/session": (peak[0] - rss_before) / 2**20 / sessions,
+        "errors": [error for session in results for error in session.errors],
+    }
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(workdir, mock_url, port):
+    env = {
+        **os.environ,
+        "OPENAI_API_BASE": f"{mock_url}/v1",
+        "WIKIPEDIA_API_URL": f"{mock_url}/w/api.php",
+        "PYTHONPATH": ROOT,
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app.py"),
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--server.enableXsrfProtection", "false",
+            "--server.fileWatcherType", "none",
+            "--browser.gatherUsageStats", "false",
+        ],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/_stcore/health").status_code == 200:
+                return process, base_url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise RuntimeError("streamlit did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--pages", nargs="+", choices=list(FLOWS), default=list(FLOWS))
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mock LLM 응답 지연(초)")
+    parser.add_argument("--output", help="결과를 JSON 으로 저장할 경로")
+    args = parser.parse_args()
+
+    MockHandler.llm_latency = args.llm_latency
+    mock = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    mock_url = f"http://127.0.0.1:{mock.server_port}"
+
+    # 앱의 ./.cache 와 sites.json 은 임시 작업 디렉터리에 만들어 저장소를 건드리지 않습니다.
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    with open(os.path.join(workdir, "sites.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            [
+                {
+                    "name": "Mock site",
+                    "sitemap": f"{mock_url}/sitemap.xml",
+                    "filter_urls": [".*/workers-ai/.*"],
+                }
+            ],
+            f,
+        )
+    process, base_url = start_app(workdir, mock_url, free_port())
+    flows = {name: FLOWS[name] for name in args.pages}
+    rows = []
+    try:
+        app = psutil.Process(process.pid)
+        for sessions in args.sessions:
+            row = asyncio.run(run_level(base_url, app, sessions, flows))
+            rows.append(row)
+            print(
+                f"{row['sessions']:>3} sessions | {row['reruns']:>4} reruns | "
+                f"{row['reruns/s']:6.2f} reruns/s | p50 {row['p50 (s)']:6.2f}s "
+                f"p95 {row['p95 (s)']:6.2f}s p99 {row['p99 (s)']:6.2f}s | "
+                f"cpu {row['cpu/session (s)']:5.2f}s/session ({row['cpu (%)']:5.1f}%) | "
+                f"{row['peak MB/session']:6.1f} MB/session | {len(row['errors'])} errors"
+            )
+            for error in sorted(set(row["errors"])):
+                print(f"      {error}")
+    finally:
+        process.terminate()
+        process.wait()
+        mock.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    # 페이지가 실패한 측정은 숫자가 맞아 보여도 믿을 수 없으므로 실패로 끝냅니다.
+    if any(row["errors"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
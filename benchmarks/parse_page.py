@@ -0,0 +1,55 @@
+"""SiteGPT 의 예전 parse_page(BeautifulSoup)와 extract_text(lxml)를 비교합니다.
+
+문서 사이트와 비슷한 HTML 로 pages/sec 와 페이지당 출력 토큰 수를 잽니다.
+
+    python benchmarks/parse_page.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tiktoken
+from bs4 import BeautifulSoup
+
+from utils.html_text import extract_text
+
+PAGES = 200
+
+NAV = "<nav><ul>" + "".join(f"<li><a href='/p/{i}'>Product {i}</a></li>" for i in range(80)) + "</ul></nav>"
+SIDEBAR = "<aside class='sidebar'>" + "".join(f"<a href='/d/{i}'>Doc link {i}</a>\n" for i in range(120)) + "</aside>"
+SCRIPT = "<script>window.__DATA__ = {" + ", ".join(f'"k{i}": {i}' for i in range(300)) + "}</script>"
+COOKIE = "<div id='cookie-banner'>We use cookies to improve your experience. Accept all cookies?</div>"
+ARTICLE = "<main><article>" + "".join(
+    f"<h2>Section {i}</h2><p>Workers AI lets you run\tmachine learning models&nbsp;on the network.\n"
+    f"Use the REST API or the binding to call model number {i}.</p>"
+    for i in range(40)
+) + "</article></main>"
+HTML = (
+    f"<html><head><title>Docs</title>{SCRIPT}</head><body><header>Header</header>"
+    f"{NAV}{SIDEBAR}{COOKIE}{ARTICLE}<footer>Footer</footer></body></html>"
+)
+
+
+def old_parse_page(html):
+    soup = BeautifulSoup(html, "html.parser")
+    header = soup.find("header")
+    footer = soup.find("footer")
+    if header:
+        header.decompose()
+    if footer:
+        footer.decompose()
+    return str(soup.get_text()).replace("\n", " ").replace("\t", " ").replace("\xa0", " ")
+
+
+encoding = tiktoken.get_encoding("cl100k_base")
+for name, parse in [("parse_page (bs4)", old_parse_page), ("extract_text (lxml)", extract_text)]:
+    start = time.perf_counter()
+    for _ in range(PAGES):
+        text = parse(HTML)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<20} {PAGES / elapsed:8.1f} pages/sec "
+        f"{len(encoding.encode(text)):6d} tokens/page"
+    )
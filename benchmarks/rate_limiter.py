@@ -0,0 +1,106 @@
+"""요청 수를 제한하는 로컬 mock OpenAI 서버를 상대로 전역 rate limiter 를 시험합니다.
+
+embedding 호출을 한꺼번에 보내는 동안 채팅 호출이 얼마나 기다리는지, 서버가
+429 를 몇 번 돌려주는지 봅니다.
+
+    python benchmarks/rate_limiter.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+from utils import openai_clients
+from utils.openai_clients import get_client
+from utils.rate_limiter import Scheduler
+
+LIMIT_PER_SECOND = 20
+EMBEDDING_CALLS = 60
+CHAT_CALLS = 10
+
+recent = deque()
+recent_lock = threading.Lock()
+rejected = [0]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with recent_lock:
+            now = time.monotonic()
+            while recent and now - recent[0] > 1:
+                recent.popleft()
+            limited = len(recent) >= LIMIT_PER_SECOND
+            if limited:
+                rejected[0] += 1
+            else:
+                recent.append(now)
+        if limited:
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}})
+            self.send_response(429)
+        else:
+            time.sleep(0.05)
+            if self.path.endswith("/embeddings"):
+                body = json.dumps({"object": "list", "data": [{"embedding": [0.0], "index": 0}], "model": "m", "usage": {}})
+            else:
+                body = json.dumps({"choices": [{"message": {"role": "assistant", "content": "ok"}, "index": 0}], "usage": {}})
+            self.send_response(200)
+        body = body.encode()
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+openai.api_base = f"http://127.0.0.1:{server.server_port}/v1"
+openai_clients.scheduler = Scheduler(
+    requests_per_minute=LIMIT_PER_SECOND * 60 * 0.75, burst_seconds=0.25
+)
+client = get_client("sk-bench")
+chat_latencies = []
+failed = [0]
+
+
+def embed():
+    try:
+        openai.Embedding.create(api_key=client.api_key, model="m", input=["text"])
+    except openai.error.RateLimitError:
+        failed[0] += 1
+
+
+def chat():
+    start = time.perf_counter()
+    client.chat_completion(model="m", messages=[{"role": "user", "content": "hi"}])
+    chat_latencies.append(time.perf_counter() - start)
+
+
+threads = [threading.Thread(target=embed) for _ in range(EMBEDDING_CALLS)]
+start = time.perf_counter()
+for thread in threads:
+    thread.start()
+time.sleep(0.2)  # embedding 이 먼저 대기열을 채운 뒤에 채팅 호출이 들어옵니다.
+chat_threads = [threading.Thread(target=chat) for _ in range(CHAT_CALLS)]
+for thread in chat_threads:
+    thread.start()
+for thread in threads + chat_threads:
+    thread.join()
+
+print(f"total time       : {time.perf_counter() - start:.2f}s for {EMBEDDING_CALLS + CHAT_CALLS} calls")
+print(f"server 429s      : {rejected[0]} (failed calls: {failed[0]})")
+print(f"chat latency max : {max(chat_latencies):.2f}s")
+for row in openai_clients.queue_stats():
+    print(row)
@@ -0,0 +1,44 @@
+"""SiteGPT map 단계의 순차 실행과 동시 실행을 가짜 LLM 으로 비교합니다.
+
+    python benchmarks/site_map_step.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import AIMessage, Document
+from langchain.schema.runnable import RunnableLambda
+
+from utils.site_answers import map_answers
+
+random.seed(0)
+latencies = [random.uniform(0.5, 1.5) for _ in range(4)]
+docs = [
+    Document(page_content=f"chunk {i}", metadata={"source": f"doc-{i}", "lastmod": ""})
+    for i in range(len(latencies))
+]
+
+
+def mock_llm(inputs):
+    time.sleep(latencies[int(inputs["context"].split()[-1])])
+    return AIMessage(content="Answer: mock\nScore: 5")
+
+
+chain = RunnableLambda(mock_llm)
+
+start = time.perf_counter()
+for doc in docs:
+    chain.invoke({"question": "q", "context": doc.page_content})
+sequential = time.perf_counter() - start
+
+start = time.perf_counter()
+answers = map_answers(chain, "q", docs)
+concurrent = time.perf_counter() - start
+
+print(f"slowest call : {max(latencies):.2f}s")
+print(f"sum of calls : {sum(latencies):.2f}s")
+print(f"sequential   : {sequential:.2f}s")
+print(f"map_answers  : {concurrent:.2f}s ({len(list(filter(None, answers)))} answers)")
@@ -0,0 +1,100 @@
+"""벡터 저장 방식(float32 / float16 / int8 / pq)별 메모리와 recall@k 를 비교합니다.
+
+OpenAI embedding 과 비슷하게 군집을 이루는 1536 차원 단위 벡터를 만들어 색인하고,
+float32 색인의 정확한 결과를 기준으로 recall@k 를 잽니다. pq 처럼 양자화한 색인은
+re-ranking 전과 후를 함께 보여 줍니다.
+
+    python benchmarks/vector_quantization.py --docs 4000 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.storage import InMemoryStore
+
+from utils.quantized_index import STORAGES, cached_embeddings, code_bytes, from_documents
+
+DIM = 1536
+
+
+class PrecomputedEmbeddings(Embeddings):
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def make_vectors(count, clusters, rng, latent_dim=128):
+    # 실제 embedding 처럼 낮은 차원의 군집 구조를 1536 차원으로 옮기고 잡음을 조금 더합니다.
+    centers = rng.standard_normal((clusters, latent_dim))
+    latent = centers[rng.integers(clusters, size=count)] + rng.standard_normal((count, latent_dim))
+    vectors = latent @ rng.standard_normal((latent_dim, DIM)) + 2 * rng.standard_normal((count, DIM))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def recall(results, expected):
+    return np.mean([len(set(r) & set(e)) / len(e) for r, e in zip(results, expected)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=4000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.docs + args.queries, clusters=50, rng=rng)
+    texts = [f"chunk {i}" for i in range(args.docs)]
+    queries = vectors[args.docs :]
+    embeddings = PrecomputedEmbeddings(dict(zip(texts, vectors[: args.docs].tolist())))
+    docs = [Document(page_content=text) for text in texts]
+
+    expected = None
+    print(f"{args.docs} chunks, {args.queries} queries, recall@{args.k} against exact float32 search")
+    print(f"{'storage':<8} | {'index MB':>8} | {'B/vector':>8} | {'cache B/vector':>14} | "
+          f"{'recall':>6} | {'reranked':>8} | {'ms/query':>8}")
+    for storage in STORAGES:
+        store = InMemoryStore()
+        vector_store = from_documents(docs, cached_embeddings(embeddings, store, "bench", storage), storage)
+        index = vector_store.index
+        index_mb = index.ntotal * code_bytes(index) / 2**20
+        cache_bytes = np.mean([len(value) for value in store.store.values()])
+
+        _, ids = index.search(queries, args.k)
+        raw = [[vector_store.index_to_docstore_id[i] for i in row] for row in ids]
+        started = time.perf_counter()
+        reranked = [
+            [
+                doc.page_content
+                for doc, _ in vector_store.similarity_search_with_score_by_vector(query.tolist(), k=args.k)
+            ]
+            for query in queries
+        ]
+        per_query = (time.perf_counter() - started) / len(queries) * 1000
+        id_to_text = {
+            doc_id: vector_store.docstore.search(doc_id).page_content
+            for doc_id in vector_store.index_to_docstore_id.values()
+        }
+        raw = [[id_to_text[doc_id] for doc_id in row] for row in raw]
+        if expected is None:
+            expected = raw
+        print(
+            f"{storage:<8} | {index_mb:8.2f} | {index_mb * 2**20 / index.ntotal:8.0f} | "
+            f"{cache_bytes:14.0f} | {recall(raw, expected):6.3f} | "
+            f"{recall(reranked, expected):8.3f} | {per_query:8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,11 @@
 from langchain.prompts import ChatPromptTemplate
-from langchain.document_loaders import UnstructuredFileLoader
-from langchain.embeddings import CacheBackedEmbeddings, OpenAIEmbeddings
 from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
-from langchain.storage import LocalFileStore
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores.faiss import FAISS
-from langchain.chat_models import ChatOpenAI
 from langchain.callbacks.base import BaseCallbackHandler
-import openai
 import streamlit as st
-import openai
-import os
+from utils.cache_manager import CachedFileStore, cache
+from utils.chunk_store import load_chunks
+from utils.quantized_index import cached_embeddings, from_documents
+from utils.openai_clients import get_client, is_busy, pool_stats, queue_stats
 
 st.set_page_config(
     page_title="APP",
@@ -30,26 +25,13 @@ class ChatCallbackHandler(BaseCallbackHandler):
 
 @st.cache_data(show_spinner="Embedding file...")
 def embed_file(file):
-    file_path = f"./.cache/files/{file.name}"
-    folder_path = os.path.dirname(file_path)
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
-
-    file_content = file.read()
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    cache_dir = LocalFileStore(f"./.cache/embeddings/{file.name}")
-    splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        separator="\n",
-        chunk_size=600,
-        chunk_overlap=100,
-    )
-    loader = UnstructuredFileLoader(file_path)
-    docs = loader.load_and_split(text_splitter=splitter)
+    cache_dir = CachedFileStore(f"./.cache/embeddings/{file.name}")
+    # QuizGPT 와 같은 chunk 저장소를 사용하므로 한 번 파싱한 파일은 다시 파싱하지 않습니다.
+    docs = load_chunks(file, chunk_size=600, chunk_overlap=100)
     # OpenAIEmbeddings애 api_key를 전달하였습니다.
-    embeddings = OpenAIEmbeddings(openai_api_key=API_KEY)
-    cached_embeddings = CacheBackedEmbeddings.from_bytes_store(embeddings, cache_dir)
-    vectorstore = FAISS.from_documents(docs, cached_embeddings)
+    embeddings = get_client(API_KEY).embeddings()
+    # VECTOR_STORAGE 환경변수로 embedding cache 와 색인을 float16, int8, pq 로 줄일 수 있습니다.
+    vectorstore = from_documents(docs, cached_embeddings(embeddings, cache_dir, namespace=""))
     retriever = vectorstore.as_retriever()
     return retriever
 
@@ -76,12 +58,8 @@ def format_docs(docs):
     return "\n\n".join(document.page_content for document in docs)
 
 def check_api_key(api_key):
-    try:
-        openai.api_key = api_key
-        openai.Model.list()
-        return True
-    except openai.error.AuthenticationError:
-        return False
+    # openai.api_key 전역 값을 바꾸지 않으므로 다른 세션의 key 와 섞이지 않습니다.
+    return get_client(api_key).check()
 
 prompt = ChatPromptTemplate.from_messages(
     [
@@ -128,6 +106,13 @@ with st.sidebar:
     else:
         is_valid = False
 
+    with st.expander("OpenAI connection pools"):
+        st.dataframe(pool_stats())
+        st.dataframe(queue_stats())
+
+    with st.expander("Disk cache"):
+        st.dataframe(cache.stats())
+
     st.link_button(
         "Github_url",
         "https://github.com/eunji925/STREAMLIT/blob/master/app.py",
@@ -287,19 +272,20 @@ if is_file:
     message = st.chat_input("Ask anything about your file...")
     if message:
         send_message(message, "human")
+        if is_busy(API_KEY):
+            st.warning("요청이 많아 대기열에서 순서를 기다리고 있습니다. 잠시만 기다려 주세요.")
         chain = (
             {
                 "context": retriever | RunnableLambda(format_docs),
                 "question": RunnablePassthrough(),
             }
             | prompt
-            | ChatOpenAI(
+            | get_client(API_KEY).chat(
                 temperature=0.1,
                 streaming=True,
                 callbacks=[
                     ChatCallbackHandler(),
                 ],
-                openai_api_key=API_KEY,
             )
         )
         with st.chat_message("ai"):
@@ -1,12 +1,12 @@
 import streamlit as st
-from langchain.document_loaders import TextLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.retrievers import WikipediaRetriever
 from langchain.schema import BaseOutputParser
 import json
 from langchain.prompts import ChatPromptTemplate
-from langchain.chat_models import ChatOpenAI
 from langchain.callbacks import StreamingStdOutCallbackHandler
+import numpy as np
+from utils.chunk_store import load_chunks
+from utils.openai_clients import get_client, is_busy
+from utils.wiki import search_wikipedia
 
 st.set_page_config(
     page_title="QuizGPT",
@@ -24,33 +24,138 @@ def format_docs(docs):
     return "\n\n".join(document.page_content for document in docs)
 
 
+STUFF_MAX_CHUNKS = 8  # 이 개수 이하의 chunk 는 한 번의 prompt 로 문제를 만듭니다.
+CHUNKS_PER_GROUP = 4  # map 단계에서 한 번의 호출에 넣을 chunk 수
+QUESTIONS_PER_GROUP = 5
+MAX_CONCURRENCY = 4  # 동시에 실행할 LLM 호출 수
+DUPLICATE_THRESHOLD = 0.92  # 이 값 이상의 cosine 유사도를 가진 문제는 중복으로 봅니다.
+
+
+def group_docs(docs, group_count):
+    # 문서 전체에서 고르게 chunk 묶음을 뽑아 앞부분에만 문제가 몰리지 않게 합니다.
+    groups = [
+        docs[i : i + CHUNKS_PER_GROUP] for i in range(0, len(docs), CHUNKS_PER_GROUP)
+    ]
+    if len(groups) <= group_count:
+        return groups
+    step = len(groups) / group_count
+    return [groups[int(i * step)] for i in range(group_count)]
+
+
+def dedupe_questions(questions, embeddings):
+    if not questions:
+        return []
+    vectors = np.array(
+        embeddings.embed_documents([question["question"] for question in questions])
+    )
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    kept = []
+    for i in range(len(questions)):
+        if kept and np.max(vectors[kept] @ vectors[i]) >= DUPLICATE_THRESHOLD:
+            continue
+        kept.append(i)
+    return [questions[i] for i in kept]
+
+
+def map_reduce_quiz(docs, question_count):
+    groups = group_docs(docs, -(-question_count // QUESTIONS_PER_GROUP))
+    # chunk 가 적어 묶음이 모자라면 묶음마다 더 많은 문제를 만들어 전체 문제 수를 맞춥니다.
+    count = -(-question_count // len(groups))
+    inputs = [{"context": format_docs(group), "count": count} for group in groups]
+    results = quiz_chain.batch(
+        inputs,
+        config={"max_concurrency": MAX_CONCURRENCY},
+        return_exceptions=True,
+    )
+    succeeded = [result for result in results if not isinstance(result, Exception)]
+    if not succeeded:
+        # 모두 실패했으면 빈 퀴즈가 cache 되지 않도록 오류를 그대로 올립니다.
+        raise results[0]
+    questions = [question for result in succeeded for question in result["questions"]]
+    questions = dedupe_questions(questions, get_client(api_key).embeddings())
+    return {"questions": questions}
+
+
 @st.cache_resource(show_spinner="Loading file...")
 def split_file(file):
-    file_content = file.read()
-    file_path = f"././.cache/quiz_files/{file.name}"
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        separator="\n",
-        chunk_size=600,
-        chunk_overlap=100, 
-    )
-    loader = TextLoader(file_path)
-    docs = loader.load_and_split(text_splitter=splitter)
-    return docs
+    # DocumentGPT 와 같은 chunk 저장소를 사용합니다.
+    return load_chunks(file, chunk_size=600, chunk_overlap=100)
 
 
 @st.cache_resource(show_spinner="Making quiz...")
-def run_quiz_chain(_docs, topic):
-    chain = {"context": questions_chain} | formatting_chain | output_parser
-    return chain.invoke(_docs)
+def run_quiz_chain(_docs, topic, quiz_size):
+    # 난이도는 퀴즈를 만든 뒤에 고르므로, 두 난이도를 합쳐 필요한 문제 수의 두 배를 만들어 둡니다.
+    # 난이도를 바꿔도 LLM 을 다시 부르지 않습니다.
+    question_count = quiz_size * 2
+    if len(_docs) > STUFF_MAX_CHUNKS:
+        return map_reduce_quiz(_docs, question_count)
+    return quiz_chain.invoke({"context": format_docs(_docs), "count": question_count})
+
+
+@st.cache_resource
+def make_quiz(_response, topic, quiz_size, level):
+    # 퀴즈를 만들 때 정답 위치를 한 번만 계산해 두고, 채점은 이 배열로만 합니다.
+    questions = [
+        question for question in _response["questions"] if question["level"] == level
+    ][:quiz_size]
+    correct_index = np.array(
+        [
+            next((i for i, answer in enumerate(question["answers"]) if answer["correct"]), -1)
+            for question in questions
+        ],
+        dtype=np.int8,
+    )
+    return questions, correct_index
+
+
+def grade(quiz_id, correct_index):
+    # 선택하지 않은 문제는 -2 로 두어 정답(-1 포함)과 절대 같지 않게 합니다.
+    selected = [st.session_state.get(f"{quiz_id}-q_{i}") for i in range(len(correct_index))]
+    selected = np.array(
+        [-2 if index is None else index for index in selected],
+        dtype=np.int8,
+    )
+    return selected != -2, selected == correct_index
+
+
+# streamlit 1.33 부터는 fragment 로 감싸 채점할 때 퀴즈 영역만 다시 실행합니다.
+fragment = getattr(st, "experimental_fragment", lambda function: function)
+
+
+@fragment
+def quiz_form(quiz_id, questions, correct_index):
+    # 위젯 key 에 퀴즈를 구분하는 값을 넣어, 주제나 난이도를 바꾸면 이전 선택이 남지 않게 합니다.
+    answered, correct = grade(quiz_id, correct_index)
+    correct_count = int(correct.sum())
+    total_questions = len(questions)
+
+    with st.form("questions_form"):
+        for i, question in enumerate(questions):
+            st.write(f"**{i+1}. {question['question']}**")
+            st.radio(
+                "Select an option.",
+                range(len(question["answers"])),
+                format_func=lambda index, answers=question["answers"]: answers[index]["answer"],
+                index=None,
+                key=f"{quiz_id}-q_{i}",
+            )
+            if correct[i]:
+                st.success("Correct!")
+            elif answered[i]:
+                st.error("Wrong!")
+
+        button = st.form_submit_button()
+        if button:
+            if correct_count == total_questions:
+                st.write("모두 정답입니다.")
+            else:
+                st.warning(f"{total_questions} 중 {correct_count} 개가 정답입니다.")
 
 
 @st.cache_resource(show_spinner="Searching Wikipedia...")
 def wiki_search(term):
-    retriever = WikipediaRetriever(top_k_results=5)
-    docs = retriever.get_relevant_documents(term)
-    return docs
+    # 디스크 캐시를 거치므로 재시작 후에도 같은 주제는 다시 받아오지 않습니다.
+    return search_wikipedia(term, top_k=5)
 
 output_parser = JsonOutputParser()
 questions_prompt = ChatPromptTemplate.from_messages(
@@ -58,7 +163,7 @@ questions_prompt = ChatPromptTemplate.from_messages(
         (
             "system",
             """
-                You are an assistant in the role of a teacher. Give 15 problems based on the received context. Each problem has 4 options. Only one of the choices is correct. Mark the correct answer using (o).Please refer to the example below. The difficulty levels of the questions are Hard and Easy. Set it randomly. And please specify the difficulty level next to the problem.
+                You are an assistant in the role of a teacher. Give {count} problems based on the received context. Each problem has 4 options. Only one of the choices is correct. Mark the correct answer using (o).Please refer to the example below. The difficulty levels of the questions are Hard and Easy. Set it randomly. And please specify the difficulty level next to the problem.
          
                 Question examples:                    
                     Question: What is the color of the ocean? (Hard)
@@ -215,6 +320,13 @@ with st.sidebar:
             options=("Hard", "Easy")
         )
 
+        quiz_size = st.number_input(
+            label="Number of questions",
+            min_value=1,
+            max_value=30,
+            value=10,
+        )
+
         choice = st.selectbox(
             label="Choice Options",
             options=("File", "Wikipedia")
@@ -222,8 +334,8 @@ with st.sidebar:
         
         if choice == "File":  
             file = st.file_uploader(
-                label="Upload File...",
-                type=['txt']
+                label="Upload a .txt .pdf or .docx file",
+                type=["pdf", "txt", "docx"]
             )
             if file:
                 docs = split_file(file) 
@@ -248,42 +360,21 @@ if not docs:
     """
     )
 else:
-    llm = ChatOpenAI(
-        api_key=api_key,
+    llm = get_client(api_key).chat(
         temperature=0.1,
         model="gpt-4o-mini",
         streaming=True,
         callbacks=[StreamingStdOutCallbackHandler()],
     )
     
-    questions_chain = {"context": format_docs} | questions_prompt | llm
+    questions_chain = questions_prompt | llm
     formatting_chain = formatting_prompt | llm
+    quiz_chain = {"context": questions_chain} | formatting_chain | output_parser
 
-    response = run_quiz_chain(docs, keyword if keyword else file.name)  
+    topic = keyword if keyword else file.name
+    if is_busy(api_key):
+        st.warning("요청이 많아 대기열에서 순서를 기다리고 있습니다. 잠시만 기다려 주세요.")
+    response = run_quiz_chain(docs, topic, quiz_size)
 
-
-    questions = [question for question in response["questions"] if question['level'] == level]
-    correct_count = 0  
-    total_questions = len(questions)  
-
-    with st.form("questions_form"):        
-        for i, question in enumerate(questions):
-            st.write(f"**{i+1}. {question['question']}**")
-            value = st.radio(
-                "Select an option.",
-                [answer["answer"] for answer in question["answers"]],
-                index=None,
-                key=f"q_{i}"
-            )
-            if {"answer": value, "correct": True} in question["answers"]:
-                st.success("Correct!")
-                correct_count += 1
-            elif value is not None:
-                st.error("Wrong!")
-                    
-        button = st.form_submit_button()
-        if button:            
-            if correct_count == total_questions:  
-                st.write("모두 정답입니다.")
-            else:  
-                st.warning(f"{total_questions} 중 {correct_count} 개가 정답입니다.")
+    questions, correct_index = make_quiz(response, topic, quiz_size, level)
+    quiz_form(f"{topic}-{quiz_size}-{level}", questions, correct_index)
@@ -1,14 +1,18 @@
-from langchain.document_loaders import SitemapLoader
-from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+from langchain.schema.runnable import RunnableLambda
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores.faiss import FAISS
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 import streamlit as st
-import openai
-from langchain.schema import HumanMessage
+import os
+from langchain.schema import AIMessage, HumanMessage
+from utils.answer_cache import AnswerCache, content_hash
+from utils.crawl_store import crawl_site, site_key
+from utils.html_text import extract_text
+from utils.openai_clients import get_client, is_busy
+from utils.site_answers import MAP_TIMEOUT, map_answers
+from utils.site_index import update_site_index
+from utils.site_registry import SiteRegistry, load_sites
+from utils.site_retrieval import retrieve
 
 st.set_page_config(
     page_title="SiteGPT",
@@ -17,13 +21,19 @@ st.set_page_config(
 
 st.title("SiteGPT")
 
+class ChatCallbackHandler(BaseCallbackHandler):
+    message = ""
+
+    def on_llm_start(self, *args, **kwargs):
+        self.message = ""
+        self.message_box = st.empty()
+    def on_llm_new_token(self, token, *args, **kwargs):
+        self.message += token
+        self.message_box.markdown(self.message.replace("\n[출처]", " "))
+
 def check_api_key(api_key):
-    try:
-        openai.api_key = api_key
-        openai.Model.list()
-        return True
-    except openai.error.AuthenticationError:
-        return False
+    # openai.api_key 전역 값을 바꾸지 않으므로 다른 세션의 key 와 섞이지 않습니다.
+    return get_client(api_key).check()
 
 with st.sidebar:
     docs = None
@@ -50,17 +60,23 @@ with st.sidebar:
 if not key:
     st.markdown(
         """
-            API key를 입력하고 input box 가 나타나면 Cloudflare 에 대한 질문을 입력하세요.
+            API key를 입력하고 input box 가 나타나면 선택한 사이트에 대한 질문을 입력하세요.
         """
     )
 else:
 
-    llm = ChatOpenAI(
-    openai_api_key=api_key,  # 유효한 OpenAI API 키 사용
+    client = get_client(api_key)  # 유효한 OpenAI API 키의 client ( 연결 pool 을 공유합니다 )
+    llm = client.chat(
     temperature=0.1,
     model="gpt-4o-mini",  # gpt-4o-mini가 아니라면 gpt-4로 변경
+    request_timeout=MAP_TIMEOUT,
+    )
+    # 최종 답변은 토큰 단위로 화면에 바로 그립니다.
+    choose_llm = client.chat(
+    temperature=0.1,
+    model="gpt-4o-mini",
     streaming=True,  # 스트리밍 활성화
-    callbacks=[StreamingStdOutCallbackHandler()]  # 스트리밍 콜백 설정
+    callbacks=[ChatCallbackHandler()]  # 스트리밍 콜백 설정
     )
 
     answers_prompt = ChatPromptTemplate.from_template("""
@@ -89,28 +105,42 @@ else:
         Question: {question}
         """)
 
+    answer_cache = AnswerCache()
+
     def get_answers(inputs):
         docs = inputs['docs']
         question = inputs['question']
         answers_chain = answers_prompt | llm
-        # answers = []
-        # for doc in docs:
-        #     result = answers_chain.invoke({
-        #         "question": question,
-        #         "context": doc.page_content
-        #     })
-        #     answers.append(result.content)
+        chunks = [content_hash(doc.page_content) for doc in docs]
+        # 같은 질문과 chunk 로 이미 만든 답은 LLM 을 부르지 않고 cache 에서 가져옵니다.
+        answers = [answer_cache.get("map", question, [chunk]) for chunk in chunks]
+        missing = [i for i, answer in enumerate(answers) if answer is None]
+        if missing:
+            progress = st.progress(0.0, text="Reading documents...")
+
+            def on_answer(done, total):
+                progress.progress(done / total, text=f"Reading documents... ({done}/{total})")
+
+            # 문서별 호출을 순서대로 기다리지 않고 동시에 실행합니다.
+            results = map_answers(
+                answers_chain, question, [docs[i] for i in missing], on_answer=on_answer
+            )
+            progress.empty()
+            for i, result in zip(missing, results):
+                if result:
+                    answers[i] = result["answer"]
+                    answer_cache.put("map", question, [chunks[i]], result["answer"])
+        found = [i for i, answer in enumerate(answers) if answer is not None]
         return {
             "question": question,
+            "chunks": [chunks[i] for i in found],
             "answers": [
                 {
-                    "answer": answers_chain.invoke(
-                        {"question": question, "context": doc.page_content}
-                    ).content,
-                    "source": doc.metadata["source"],
-                    "date": doc.metadata["lastmod"],
+                    "answer": answers[i],
+                    "source": docs[i].metadata["source"],
+                    "date": docs[i].metadata["lastmod"],
                 }
-                for doc in docs
+                for i in found
             ],
         }
 
@@ -135,57 +165,86 @@ else:
     def choose_answer(inputs):
         answers = inputs["answers"]
         question = inputs["question"]
-        choose_chain = choose_prompt | llm
+        # 같은 chunk 들로 만든 최종 답이 있으면 choose 단계도 건너뜁니다.
+        cached = answer_cache.get("final", question, inputs["chunks"])
+        if cached is not None:
+            st.markdown(cached.replace("\n[출처]", " "))
+            return AIMessage(content=cached)
+        choose_chain = choose_prompt | choose_llm
         condensed = "\n\n".join(
             f"{answer['answer']}\nSource:{answer['source']}\date:{answer['date']}\n"
             for answer in answers
         )
-        return choose_chain.invoke(
+        result = choose_chain.invoke(
             {
                 "question": question,
                 "answers": condensed,
             }
         )
+        answer_cache.put("final", question, inputs["chunks"], result.content)
+        return result
+
+    def parse_page(html): # html : document의 전체 HTML 문자열
+        # nav, aside, script, 쿠키 배너 등을 지우고 공백을 정리한 본문만 남깁니다.
+        return extract_text(html)
 
-    def parse_page(soup): # soup : document의 전체 HTML을 가진 beautiful soup object 값
-        header = soup.find("header")
-        footer = soup.find("footer")
-        if header:
-            header.decompose()
-        if footer:
-            footer.decompose()
-        return str(soup.get_text()).replace("\n"," ").replace("\t"," ").replace("\xa0", " ") # 공백등을 제거하기 위한 replace
-        
 
-    @st.cache_data(show_spinner="Loading website...")
-    def load_website(url):
+    def refresh_site(site, embeddings):
         splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
             chunk_size = 800,
             chunk_overlap = 200,
         )
-        loader = SitemapLoader(
-            url,
-            filter_urls=[
-            r"^(.*\/workers-ai\/).*",
-            r"^(.*\/vectorize\/).*",
-            r"^(.*\/ai-gateway\/).*",
-        ],
-            parsing_function = parse_page
+        # 이전에 받아 둔 페이지는 sitemap 의 lastmod 나 ETag 가 바뀐 경우에만 다시 받습니다.
+        store, changed, removed = crawl_site(
+            site["sitemap"],
+            filter_urls = site["filter_urls"],
+            parsing_function = parse_page,
+            splitter = splitter,
+            concurrency_per_host = 5, # host 당 동시 요청 수
+            requests_per_second = 5, # host 당 요청 속도 ( robots.txt 의 Crawl-delay 가 있으면 그 값을 따릅니다 )
+        )
+        # 바뀐 페이지의 chunk 만 색인에서 바꾸고, 바뀌지 않은 chunk 는 embedding cache 를 사용합니다.
+        update_site_index(
+            site_key(site["sitemap"]), store, changed, removed, embeddings
         )
-        loader.requests_per_second = 1 # 요청 속도 조정 ( 1초에 1번 )
-        docs = loader.load_and_split(text_splitter=splitter)
-        vector_store = FAISS.from_documents(docs, OpenAIEmbeddings())
-        return vector_store.as_retriever()
+        # 바뀌거나 사라진 chunk 로 만든 답은 더 이상 쓰지 않습니다.
+        answer_cache.invalidate(store.stale_chunks)
+        store.save()
+
+
+    @st.cache_resource
+    def get_registry():
+        # 모든 세션이 하나의 registry 를 함께 사용합니다.
+        return SiteRegistry(
+            load_sites(),
+            refresh_site,
+            max_bytes=int(os.environ.get("SITE_INDEX_MEMORY_MB", 512)) * 2**20,
+        )
+
 
+    registry = get_registry()
+    site = st.selectbox("사이트를 선택하세요.", list(registry.sites))
+    with st.spinner("Loading website..."):
+        try:
+            vector_store = registry.get(site, client.embeddings())
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+    with st.sidebar:
+        with st.expander("Index registry"):
+            st.dataframe(registry.stats())
+
+    def retrieve_docs(question):
+        # 관련 없는 chunk 는 map 단계 전에 걸러서 LLM 호출을 줄입니다.
+        docs, skipped = retrieve(vector_store, question)
+        st.caption(f"Map calls: {len(docs)} (skipped {skipped})")
+        return {"docs": docs, "question": question}
 
-    retriever = load_website("https://developers.cloudflare.com/sitemap-0.xml")
     query = st.text_input("해당 웹사이트에 대해 물어보세요.")
     if query:
-        chain = {
-            "docs" : retriever,
-            "question" : RunnablePassthrough()
-        } | RunnableLambda(get_answers) | RunnableLambda(choose_answer)
+        if is_busy(api_key):
+            st.warning("요청이 많아 대기열에서 순서를 기다리고 있습니다. 잠시만 기다려 주세요.")
+        chain = RunnableLambda(retrieve_docs) | RunnableLambda(get_answers) | RunnableLambda(choose_answer)
                 
-        result = chain.invoke(query)
-        #st.write(result)
-        st.markdown(result.content.replace("\n[출처]", " "))
\ No newline at end of file
+        # 답변은 ChatCallbackHandler 가 스트리밍하면서 그립니다.
+        chain.invoke(query)
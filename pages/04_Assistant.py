@@ -1,6 +1,10 @@
 import streamlit as st
-import openai
-from pydantic import BaseModel, Field
+import io
+import time
+from utils.openai_clients import get_client, is_busy
+from utils.research_agent import MODEL, run_research
+from utils.research_cache import get_cached_result, put_cached_result
+from utils.research_tools import make_tools
 
 # 기본 설정
 st.set_page_config(page_title="AssistantGPT", page_icon="💼")
@@ -28,49 +32,44 @@ if "api_key" not in st.session_state:
     st.stop()
 
 
-class DuckDuckGoSearchToolArgsSchema(BaseModel):
-    query: str = Field(description="The query you will search for")
+UPDATE_INTERVAL = 0.1  # 화면을 다시 그리는 최소 간격(초)
 
 
-class WikipediaSearchToolArgsSchema(BaseModel):
-    query: str = Field(description="The query you will search for on Wikipedia")
+class StreamRenderer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.last_update = 0.0
+        self.text = ""
+        self.box = st.empty()
 
+    def on_token(self, token):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.text += token
+        # 토큰마다 그리지 않고 UPDATE_INTERVAL 마다 모아서 그립니다.
+        if time.perf_counter() - self.last_update >= UPDATE_INTERVAL:
+            self.flush()
 
-class WebScrapingToolArgsSchema(BaseModel):
-    url: str = Field(description="The URL of the website you want to scrape")
+    def on_tool_calls(self, tool_calls):
+        names = ", ".join(call["function"]["name"] for call in tool_calls)
+        self.text = ""
+        self.box.caption(f"Running tools: {names}")
 
+    def flush(self):
+        self.box.markdown(self.text)
+        self.last_update = time.perf_counter()
 
-class SaveToTXTToolArgsSchema(BaseModel):
-    text: str = Field(description="The text you will save to a file.")
 
-
-def perform_search(query, api_key):
-    system_message = {
-        "role": "system",
-        "content": """
-        You are a research expert. 
-        Your task is to use Wikipedia or DuckDuckGo to gather comprehensive and accurate information about the query provided. 
-        When you find a relevant website through DuckDuckGo, scrape the content from that website. 
-        Ensure the final result contains detailed information, all relevant sources, and citations.
-        """
-    }
-
-    user_message = {"role": "user", "content": query}
-
-    response = openai.ChatCompletion.create(
-        model="gpt-4-1106-preview",
-        messages=[system_message, user_message],
-        api_key=api_key
+def perform_search(query, client, renderer, results_buffer):
+    # 모델이 요청한 검색과 scraping 을 실제로 실행하고, 같은 턴의 호출은 동시에 실행합니다.
+    return run_research(
+        query,
+        client.api_key,
+        tools=make_tools(results_buffer),
+        handler=renderer,
     )
 
-    return response['choices'][0]['message']['content']
-
-
-def save_results_to_file(text):
-    with open("research_results.txt", "w", encoding="utf-8") as file:
-        file.write(text)
-    return "Research results saved to research_results.txt"
-
 
 # 유저 입력과 어시스턴트 호출
 query = st.text_input("Enter the query you want to research")
@@ -78,31 +77,59 @@ query = st.text_input("Enter the query you want to research")
 if query:
     st.write(f"Searching for: {query}")
 
-    # OpenAI 어시스턴트 호출
-    with st.spinner("Researching..."):
-        try:
-            results = perform_search(query, st.session_state["api_key"])
-            st.success("Research complete!")
-            st.write(results)
-            
-            # 결과를 파일에 저장
-            save_results_to_file(results)
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+    # 결과는 세션 메모리, 디스크 cache 순서로 찾고 없을 때만 research 를 실행합니다.
+    if "research_results" not in st.session_state:
+        st.session_state["research_results"] = {}
+    results = st.session_state["research_results"].get(query)
+    if results is None:
+        results = get_cached_result(query, MODEL)
+        if results is not None:
+            st.caption("Loaded from the research cache.")
+            st.session_state["research_results"][query] = results
+            st.session_state.setdefault("history", []).append(f"User: {query}\nAssistant: {results}")
+    if results is not None:
+        st.write(results)
+    else:
+        if is_busy(st.session_state["api_key"]):
+            st.warning("요청이 많아 대기열에서 순서를 기다리고 있습니다. 잠시만 기다려 주세요.")
+
+        # OpenAI 어시스턴트 호출
+        # 새 질문이 들어오면 streamlit 이 다음 화면 갱신에서 이 실행을 멈추고,
+        # stream_completion 의 finally 가 남은 stream 을 닫습니다.
+        with st.spinner("Researching..."):
+            try:
+                renderer = StreamRenderer()
+                results_buffer = io.StringIO()
+                answer = perform_search(
+                    query, get_client(st.session_state["api_key"]), renderer, results_buffer
+                )
+                renderer.flush()
+                st.success("Research complete!")
+                time_to_first_token, total_time = st.columns(2)
+                if renderer.first_token_at is not None:
+                    time_to_first_token.metric(
+                        "Time to first token",
+                        f"{renderer.first_token_at - renderer.started:.1f}s",
+                    )
+                total_time.metric("Total time", f"{time.perf_counter() - renderer.started:.1f}s")
+
+                # 모델이 save_to_txt 로 저장한 내용이 있으면 그것을, 없으면 최종 답을 결과로 씁니다.
+                results = results_buffer.getvalue() or answer
+                st.session_state["research_results"][query] = results
+                put_cached_result(query, MODEL, results)
+                st.session_state.setdefault("history", []).append(f"User: {query}\nAssistant: {results}")
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
 
     # 대화 기록 표시
-    if "history" not in st.session_state:
-        st.session_state["history"] = []
-    st.session_state["history"].append(f"User: {query}\nAssistant: {results}")
-
     st.markdown("### Conversation History")
-    for i, history in enumerate(st.session_state["history"], 1):
+    for i, history in enumerate(st.session_state.get("history", []), 1):
         st.markdown(f"**{i}.** {history}")
 
-    # 파일 다운로드 버튼
-    with open("research_results.txt", "r", encoding="utf-8") as file:  # encoding="utf-8" 추가
+    # 파일 다운로드 버튼 ( 디스크를 거치지 않고 메모리의 결과를 바로 내려줍니다 )
+    if results is not None:
         st.download_button(
             "Download Research Results",
-            data=file.read(),
+            data=results,
             file_name="research_results.txt",
         )
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+CACHE_PATH = "./.cache/answers.sqlite"
+PROMPT_VERSION = "1"  # answers_prompt 나 choose_prompt 를 바꾸면 올려서 이전 답을 버립니다.
+MAX_ENTRIES = 20000
+TTL = 60 * 60 * 24 * 7
+
+
+def normalize_question(question):
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def parse_score(answer):
+    match = re.search(r"Score:\s*(\d+)", answer)
+    return int(match.group(1)) if match else None
+
+
+class AnswerCache:
+    """SiteGPT 의 map 단계 답과 최종 답을 sqlite 에 보관합니다.
+
+    map 단계 답은 (질문, chunk hash, prompt 버전), 최종 답은 (질문, 사용한 답들의
+    hash, prompt 버전)으로 찾습니다. chunks 열에는 답을 만드는 데 쓴 chunk hash
+    를 적어 두어 crawl store 가 chunk 를 바꾸면 관련된 답을 함께 지웁니다.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    chunks TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    score INTEGER,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+
+    def connect(self):
+        # streamlit 세션마다 thread 가 다르므로 호출할 때마다 연결합니다.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def key(self, kind, question, chunks):
+        raw = "\n".join([kind, PROMPT_VERSION, normalize_question(question), *chunks])
+        return content_hash(raw)
+
+    def get(self, kind, question, chunks):
+        key = self.key(kind, question, chunks)
+        now = time.time()
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT answer, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, kind, question, chunks, answer):
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(kind, question, chunks),
+                    " ".join(chunks),
+                    answer,
+                    parse_score(answer),
+                    now,
+                    now,
+                ),
+            )
+            self.evict(conn, now)
+
+    def evict(self, conn, now):
+        conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        # 가장 오래 쓰지 않은 답부터 지워 max_entries 를 넘지 않게 합니다.
+        conn.execute(
+            """
+            DELETE FROM answers WHERE key IN (
+                SELECT key FROM answers ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def invalidate(self, chunk_hashes):
+        with self.connect() as conn:
+            conn.executemany(
+                "DELETE FROM answers WHERE instr(chunks, ?) > 0",
+                [(chunk,) for chunk in chunk_hashes],
+            )
@@ -0,0 +1,267 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain.storage import LocalFileStore
+
+CACHE_ROOT = "./.cache"
+INDEX_PATH = f"{CACHE_ROOT}/cache_index.sqlite"
+METRICS_PATH = f"{CACHE_ROOT}/metrics.json"
+MAX_BYTES = int(os.environ.get("CACHE_MAX_MB", 2048)) * 2**20
+LOW_WATERMARK = 0.9  # 한도를 넘으면 한도의 90% 까지 지워 매번 eviction 이 일어나지 않게 합니다.
+MIN_IDLE = 60  # 최근에 쓴 entry 는 다른 세션이 읽는 중일 수 있어 지우지 않습니다.
+METRICS_INTERVAL = 10  # metrics 파일을 다시 쓰는 최소 간격(초)
+# 스스로 크기를 관리하거나, 지우면 서로 어긋나는 항목은 quota 관리에서 뺍니다.
+PINNED = ("crawl", "site_index")
+
+
+def atomic_write(path, data):
+    # 다른 세션이 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체합니다.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data.encode() if isinstance(data, str) else data)
+    os.replace(tmp_path, path)
+
+
+class CacheManager:
+    """./.cache 아래 파일들의 크기와 마지막 사용 시각을 sqlite 에 기록합니다.
+
+    쓰기는 모두 임시 파일을 거쳐 교체하고, 전체 크기가 max_bytes 를 넘으면 가장
+    오래 쓰지 않은 파일부터 지웁니다. 영역(./.cache 바로 아래 디렉터리) 별로
+    hit, miss, eviction 수를 세어 sidebar 와 metrics 파일로 보여 줍니다.
+    """
+
+    def __init__(self, root=CACHE_ROOT, max_bytes=MAX_BYTES, min_idle=MIN_IDLE):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.min_idle = min_idle
+        self.metrics_written = 0
+        os.makedirs(self.root, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    path TEXT PRIMARY KEY,
+                    area TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stats (
+                    area TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    evictions INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+        self.scan()
+
+    def connect(self):
+        # streamlit 세션마다 thread 가 다르므로 호출할 때마다 연결합니다.
+        return sqlite3.connect(f"{self.root}/{os.path.basename(INDEX_PATH)}", timeout=30)
+
+    def key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def area(self, key):
+        return key.split(os.sep, 1)[0]
+
+    def managed(self, key):
+        # sqlite 파일은 스스로 크기를 관리합니다. ( answers.sqlite, 이 색인 등 )
+        return (
+            os.sep in key
+            and self.area(key) not in PINNED
+            and not key.endswith(".tmp")
+        )
+
+    def scan(self):
+        # 이 manager 를 쓰기 전에 만들어진 파일도 mtime 을 마지막 사용 시각으로 등록합니다.
+        rows = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                key = self.key(path)
+                if self.managed(key):
+                    stat = os.stat(path)
+                    rows.append((key, self.area(key), stat.st_size, stat.st_mtime))
+        with self.connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)", rows)
+
+    def count(self, conn, column, areas):
+        conn.executemany(
+            f"""
+            INSERT INTO stats (area, {column}) VALUES (?, 1)
+            ON CONFLICT (area) DO UPDATE SET {column} = {column} + 1
+            """,
+            [(area,) for area in areas],
+        )
+
+    def lookup_many(self, paths, ttl=None):
+        """파일이 있는지 확인하고 hit 이면 마지막 사용 시각을 갱신합니다."""
+        now = time.time()
+        found = []
+        for path in paths:
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                age = None
+            fresh = age is not None and (ttl is None or age <= ttl)
+            found.append(fresh)
+        keys = [self.key(path) for path in paths]
+        with self.connect() as conn:
+            conn.executemany(
+                "UPDATE entries SET accessed = ? WHERE path = ?",
+                [(now, key) for key, hit in zip(keys, found) if hit],
+            )
+            self.count(conn, "hits", [self.area(key) for key, hit in zip(keys, found) if hit])
+            self.count(conn, "misses", [self.area(key) for key, hit in zip(keys, found) if not hit])
+        return found
+
+    def lookup(self, path, ttl=None):
+        return self.lookup_many([path], ttl)[0]
+
+    def read_many(self, paths, ttl=None):
+        values = []
+        for path, hit in zip(paths, self.lookup_many(paths, ttl)):
+            if not hit:
+                values.append(None)
+                continue
+            try:
+                with open(path, "rb") as f:
+                    values.append(f.read())
+            except OSError:
+                # lookup 과 읽기 사이에 다른 프로세스가 지웠으면 miss 로 봅니다.
+                values.append(None)
+        return values
+
+    def read_bytes(self, path, ttl=None):
+        return self.read_many([path], ttl)[0]
+
+    def read_text(self, path, ttl=None):
+        data = self.read_bytes(path, ttl)
+        return None if data is None else data.decode("utf-8")
+
+    def read_json(self, path, ttl=None):
+        data = self.read_bytes(path, ttl)
+        return None if data is None else json.loads(data)
+
+    def write_many(self, items):
+        """(path, data) 들을 원자적으로 쓰고 크기를 기록한 뒤 필요하면 eviction 합니다."""
+        now = time.time()
+        rows = []
+        for path, data in items:
+            atomic_write(path, data)
+            key = self.key(path)
+            if self.managed(key):
+                rows.append((key, self.area(key), os.path.getsize(path), now))
+        with self.connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                self.evict(conn, total, now)
+        self.write_metrics()
+
+    def write(self, path, data):
+        self.write_many([(path, data)])
+
+    def write_json(self, path, data):
+        self.write(path, json.dumps(data, ensure_ascii=False))
+
+    def evict(self, conn, total, now):
+        # 가장 오래 쓰지 않은 파일부터 지워 LOW_WATERMARK 아래로 내립니다.
+        target = self.max_bytes * LOW_WATERMARK
+        rows = conn.execute(
+            "SELECT path, area, size FROM entries WHERE accessed < ? ORDER BY accessed",
+            (now - self.min_idle,),
+        ).fetchall()
+        evicted = []
+        for key, area, size in rows:
+            if total <= target:
+                break
+            path = os.path.join(self.root, key)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.remove_empty_dirs(os.path.dirname(path))
+            evicted.append((key, area))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE path = ?", [(key,) for key, _ in evicted])
+        self.count(conn, "evictions", [area for _, area in evicted])
+
+    def remove_empty_dirs(self, directory):
+        while directory != self.root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def stats(self):
+        with self.connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT area, COUNT(*), SUM(size) FROM entries GROUP BY area
+                """
+            ).fetchall()
+            counters = {
+                area: (hits, misses, evictions)
+                for area, hits, misses, evictions in conn.execute("SELECT * FROM stats")
+            }
+        sizes = {area: (entries, size) for area, entries, size in rows}
+        stats = []
+        for area in sorted(set(sizes) | set(counters)):
+            entries, size = sizes.get(area, (0, 0))
+            hits, misses, evictions = counters.get(area, (0, 0, 0))
+            stats.append(
+                {
+                    "area": area,
+                    "entries": entries,
+                    "MB": round(size / 2**20, 1),
+                    "hits": hits,
+                    "misses": misses,
+                    "hit rate": round(hits / (hits + misses), 2) if hits + misses else None,
+                    "evictions": evictions,
+                }
+            )
+        return stats
+
+    def write_metrics(self, force=False):
+        # 외부 수집기가 읽을 수 있도록 METRICS_INTERVAL 마다 JSON 으로 남깁니다.
+        now = time.time()
+        if not force and now - self.metrics_written < METRICS_INTERVAL:
+            return
+        self.metrics_written = now
+        metrics = {
+            "updated": now,
+            "max_mb": round(self.max_bytes / 2**20, 1),
+            "areas": self.stats(),
+        }
+        atomic_write(
+            os.path.join(self.root, os.path.basename(METRICS_PATH)),
+            json.dumps(metrics, ensure_ascii=False, indent=2),
+        )
+
+
+class CachedFileStore(LocalFileStore):
+    """CacheBackedEmbeddings 용 LocalFileStore 입니다.
+
+    값을 원자적으로 쓰고, 읽고 쓴 파일을 cache manager 에 기록합니다.
+    """
+
+    def mget(self, keys):
+        return cache.read_many([self._get_full_path(key) for key in keys])
+
+    def mset(self, key_value_pairs):
+        cache.write_many([(self._get_full_path(key), value) for key, value in key_value_pairs])
+
+
+cache = CacheManager()
@@ -0,0 +1,58 @@
+import hashlib
+import os
+
+from langchain.schema import Document
+from langchain.text_splitter import CharacterTextSplitter
+
+from utils.cache_manager import cache
+
+FILES_DIR = "./.cache/files"
+CHUNKS_DIR = "./.cache/chunks"
+
+
+def chunk_key(content, chunk_size, chunk_overlap):
+    content_hash = hashlib.sha256(content).hexdigest()
+    return f"{content_hash}-{chunk_size}-{chunk_overlap}"
+
+
+def save_file(content, name):
+    # 같은 내용의 파일은 이름이 달라도 한 번만 저장합니다.
+    extension = os.path.splitext(name)[1]
+    file_path = f"{FILES_DIR}/{hashlib.sha256(content).hexdigest()}{extension}"
+    if not cache.lookup(file_path):
+        cache.write(file_path, content)
+    return file_path
+
+
+def parse_file(file_path, chunk_size, chunk_overlap):
+    # unstructured 는 import 가 무거우므로 실제로 파싱할 때만 불러옵니다.
+    from langchain.document_loaders import UnstructuredFileLoader
+
+    splitter = CharacterTextSplitter.from_tiktoken_encoder(
+        separator="\n",
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    loader = UnstructuredFileLoader(file_path)
+    return loader.load_and_split(text_splitter=splitter)
+
+
+def load_chunks(file, chunk_size=600, chunk_overlap=100):
+    """DocumentGPT 와 QuizGPT 가 함께 쓰는 chunk 저장소입니다.
+
+    파일 내용의 hash 와 splitter 설정으로 찾기 때문에, 한 페이지에서 파싱한
+    파일은 다른 페이지에서 다시 파싱하지 않습니다.
+    """
+    content = file.getvalue()
+    chunks_path = f"{CHUNKS_DIR}/{chunk_key(content, chunk_size, chunk_overlap)}.json"
+    chunks = cache.read_json(chunks_path)
+    if chunks is not None:
+        return [Document(**chunk) for chunk in chunks]
+
+    file_path = save_file(content, file.name)
+    docs = parse_file(file_path, chunk_size, chunk_overlap)
+    cache.write_json(
+        chunks_path,
+        [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs],
+    )
+    return docs
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+
+from langchain.schema import Document
+
+from utils.crawler import Crawler
+
+CRAWL_DIR = "./.cache/crawl"
+
+
+def site_key(sitemap_url):
+    return hashlib.sha256(sitemap_url.encode()).hexdigest()[:16]
+
+
+class CrawlStore:
+    """사이트의 URL 마다 lastmod, ETag, 내용 hash 와 잘라 둔 chunk 를 보관합니다."""
+
+    def __init__(self, sitemap_url):
+        self.path = f"{CRAWL_DIR}/{site_key(sitemap_url)}.json"
+        self.pages = {}
+        # 이번 crawl 에서 바뀌거나 사라진 chunk 의 hash 입니다. 답변 cache 를 지울 때 씁니다.
+        self.stale_chunks = []
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.pages = json.load(f)
+
+    def documents(self, urls=None):
+        urls = self.pages.keys() if urls is None else urls
+        return [
+            Document(**chunk) for url in urls for chunk in self.pages[url]["chunks"]
+        ]
+
+    def drop_chunks(self, url):
+        if url in self.pages:
+            self.stale_chunks.extend(
+                hashlib.sha256(chunk["page_content"].encode()).hexdigest()
+                for chunk in self.pages[url]["chunks"]
+            )
+
+    def save(self):
+        os.makedirs(CRAWL_DIR, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def parse_sitemap(content, filter_urls):
+    """(페이지 URL -> lastmod, 하위 sitemap URL 목록) 을 돌려줍니다.
+
+    SitemapLoader 처럼 filter_urls 가 비어 있으면 모든 페이지를 받고, <sitemapindex>
+    의 <sitemap> 항목은 페이지가 아니라 다시 읽을 sitemap 으로 돌려줍니다.
+    """
+    entries = {}
+    sitemaps = []
+    for element in ElementTree.fromstring(content):
+        # sitemap 의 namespace 와 상관없이 태그 이름만 봅니다.
+        tag = element.tag.split("}")[-1]
+        fields = {child.tag.split("}")[-1]: (child.text or "").strip() for child in element}
+        loc = fields.get("loc")
+        if not loc:
+            continue
+        if tag == "sitemap":
+            sitemaps.append(loc)
+        elif not filter_urls or any(re.match(pattern, loc) for pattern in filter_urls):
+            entries[loc] = fields.get("lastmod", "")
+    return entries, sitemaps
+
+
+async def fetch_sitemap(crawler, sitemap_url, filter_urls):
+    """sitemap index 를 따라가며 모든 페이지를 모읍니다.
+
+    (entries, complete) 를 돌려줍니다. 하위 sitemap 을 하나라도 받지 못했으면
+    complete 가 False 이고, 그때는 목록에 없는 페이지를 지우면 안 됩니다.
+    """
+    response = await crawler.fetch(sitemap_url)
+    if response is None:
+        raise ValueError(f"robots.txt does not allow fetching {sitemap_url}")
+    response.raise_for_status()
+    entries, pending = parse_sitemap(response.content, filter_urls)
+    seen = {sitemap_url}
+    complete = True
+    while pending:
+        requests = {url: {} for url in pending if url not in seen}
+        seen.update(requests)
+        pending = []
+        async for url, response in crawler.fetch_all(requests):
+            if response is None or isinstance(response, Exception) or response.status_code != 200:
+                complete = False
+                continue
+            try:
+                child_entries, child_sitemaps = parse_sitemap(response.content, filter_urls)
+            except ElementTree.ParseError:
+                complete = False
+                continue
+            entries.update(child_entries)
+            pending.extend(child_sitemaps)
+    return entries, complete
+
+
+def split_page(html, url, lastmod, parsing_function, splitter):
+    text = parsing_function(html)
+    docs = splitter.split_documents(
+        [
+            Document(
+                page_content=text,
+                metadata={"source": url, "loc": url, "lastmod": lastmod},
+            )
+        ]
+    )
+    return hashlib.sha256(text.encode()).hexdigest(), docs
+
+
+async def acrawl_site(sitemap_url, filter_urls, parsing_function, splitter, **crawler_options):
+    store = CrawlStore(sitemap_url)
+    changed = []
+    async with Crawler(**crawler_options) as crawler:
+        entries, complete = await fetch_sitemap(crawler, sitemap_url, filter_urls)
+        requests = {}
+        for url, lastmod in entries.items():
+            record = store.pages.get(url)
+            if record and lastmod and record["lastmod"] == lastmod:
+                continue
+            requests[url] = {"If-None-Match": record["etag"]} if record and record["etag"] else {}
+        # 받은 페이지는 끝나는 대로 바로 잘라서, 나머지 요청과 겹쳐 처리합니다.
+        async for url, response in crawler.fetch_all(requests):
+            record = store.pages.get(url)
+            lastmod = entries[url]
+            if response is None or isinstance(response, Exception):
+                # robots.txt 가 막았거나 받지 못한 페이지는 이전 내용을 그대로 사용합니다.
+                continue
+            if response.status_code == 304:
+                record["lastmod"] = lastmod
+                continue
+            if response.status_code != 200:
+                continue
+            etag = response.headers.get("ETag")
+            try:
+                content_hash, docs = await asyncio.to_thread(
+                    split_page, response.text, url, lastmod, parsing_function, splitter
+                )
+            except Exception:
+                # 한 페이지를 읽지 못해도 crawl 전체를 멈추지 않고 이전 내용을 그대로 사용합니다.
+                continue
+            if record and record["hash"] == content_hash:
+                record.update(lastmod=lastmod, etag=etag)
+                continue
+            store.drop_chunks(url)
+            store.pages[url] = {
+                "lastmod": lastmod,
+                "etag": etag,
+                "hash": content_hash,
+                "chunks": [
+                    {"page_content": doc.page_content, "metadata": doc.metadata}
+                    for doc in docs
+                ],
+            }
+            changed.append(url)
+    removed = [url for url in store.pages if url not in entries] if complete else []
+    for url in removed:
+        store.drop_chunks(url)
+        del store.pages[url]
+    return store, changed, removed
+
+
+def crawl_site(sitemap_url, filter_urls, parsing_function, splitter, **crawler_options):
+    """sitemap 에서 lastmod 가 바뀐 페이지만 다시 받아 chunk 를 갱신합니다.
+
+    (store, changed, removed) 를 돌려줍니다. 색인을 다 갱신한 뒤에 store.save()
+    를 불러야 다음 실행에서 바뀐 페이지를 놓치지 않습니다. crawler_options 는
+    Crawler 에 그대로 전달합니다.
+    """
+    return asyncio.run(
+        acrawl_site(sitemap_url, filter_urls, parsing_function, splitter, **crawler_options)
+    )
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+USER_AGENT = "SiteGPT"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HostLimiter:
+    """한 host 에 대한 동시 요청 수와 요청 간격을 지킵니다."""
+
+    def __init__(self, concurrency, interval):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = interval
+        self.lock = asyncio.Lock()
+        self.next_time = 0.0
+
+    async def wait_turn(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Crawler:
+    """host 별 동시 요청 수와 속도 제한, robots.txt 를 지키는 비동기 crawler 입니다.
+
+    하나의 httpx.AsyncClient 를 공유하므로 같은 host 에는 keep-alive 연결을
+    재사용합니다.
+    """
+
+    def __init__(
+        self,
+        concurrency_per_host=5,
+        requests_per_second=5,
+        max_retries=3,
+        timeout=30,
+    ):
+        self.concurrency_per_host = concurrency_per_host
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.robots = {}
+        self.limiters = {}
+        self.host_locks = {}
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=self.concurrency_per_host * 8,
+                max_keepalive_connections=self.concurrency_per_host * 8,
+            ),
+        )
+        return self
+
+    async def __aexit__(self, *args):
+        await self.client.aclose()
+
+    async def host_limiter(self, url):
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        lock = self.host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            if host not in self.limiters:
+                robots = RobotFileParser()
+                response = None
+                try:
+                    response = await self.client.get(f"{host}/robots.txt")
+                    lines = response.text.splitlines() if response.status_code == 200 else []
+                except httpx.HTTPError:
+                    lines = []
+                robots.parse(lines)
+                # RobotFileParser.read() 처럼 401, 403 이면 사이트 전체를 받지 않습니다.
+                if response is not None and response.status_code in (401, 403):
+                    robots.disallow_all = True
+                # Crawl-delay 가 있으면 설정한 속도보다 그 값을 우선합니다.
+                crawl_delay = robots.crawl_delay(USER_AGENT) or 0
+                self.robots[host] = robots
+                self.limiters[host] = HostLimiter(
+                    self.concurrency_per_host,
+                    max(1 / self.requests_per_second, float(crawl_delay)),
+                )
+        return self.robots[host], self.limiters[host]
+
+    async def fetch(self, url, headers=None):
+        """robots.txt 가 막은 URL 이면 None 을 돌려줍니다."""
+        robots, limiter = await self.host_limiter(url)
+        if not robots.can_fetch(USER_AGENT, url):
+            return None
+        async with limiter.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await limiter.wait_turn()
+                try:
+                    response = await self.client.get(url, headers=headers)
+                except httpx.TransportError:
+                    if attempt == self.max_retries:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                        return response
+                await asyncio.sleep(0.5 * 2**attempt)
+
+    async def fetch_all(self, requests):
+        """{url: headers} 를 받아 끝나는 순서대로 (url, response) 를 내보냅니다.
+
+        실패한 요청은 response 자리에 예외를 담아 보냅니다.
+        """
+
+        async def fetch_one(url, headers):
+            try:
+                return url, await self.fetch(url, headers)
+            except httpx.HTTPError as error:
+                return url, error
+
+        tasks = [fetch_one(url, headers) for url, headers in requests.items()]
+        for task in asyncio.as_completed(tasks):
+            yield await task
@@ -0,0 +1,79 @@
+import re
+
+import lxml.etree
+import lxml.html
+
+XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+# 본문이 아닌 영역(메뉴, 사이드바, 스크립트, 쿠키 배너 등)은 chunk 에 넣지 않습니다.
+BOILERPLATE_XPATH = " | ".join(
+    [
+        "//script",
+        "//style",
+        "//noscript",
+        "//template",
+        "//svg",
+        "//iframe",
+        "//header",
+        "//footer",
+        "//nav",
+        "//aside",
+        "//*[@role='navigation' or @role='banner' or @role='contentinfo' or @role='complementary']",
+        "//*[@aria-hidden='true']",
+        # "has-sidebar" 처럼 단어를 포함만 하는 class 는 지우지 않도록 class 는 단어 단위로 비교합니다.
+        *(
+            f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {word} ') or @id='{word}']"
+            for word in (
+                "cookie",
+                "cookie-banner",
+                "cookie-consent",
+                "consent",
+                "sidebar",
+                "breadcrumb",
+                "breadcrumbs",
+                "skip-link",
+            )
+        ),
+    ]
+)
+# 이 요소들의 앞뒤에만 공백을 넣습니다. <b>, <em>, <a> 같은 inline 요소는 단어 중간에 올 수 있습니다.
+BLOCK_TAGS = (
+    "address", "article", "aside", "blockquote", "br", "dd", "details", "div", "dl", "dt",
+    "figcaption", "figure", "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr",
+    "li", "main", "nav", "ol", "p", "pre", "section", "summary", "table", "td", "th",
+    "tr", "ul",
+)
+# 본문을 담는 요소와 그 조상은 위 조건에 걸려도 지우지 않습니다.
+PROTECTED_TAGS = {"html", "body", "main", "article"}
+
+
+def is_protected(element):
+    return element.tag in PROTECTED_TAGS or bool(element.xpath(".//main | .//article"))
+
+
+def clean_text(root):
+    for element in root.xpath(BOILERPLATE_XPATH):
+        # 이미 지운 요소 안에 있던 요소는 부모가 없으므로 건너뜁니다.
+        if element.getparent() is not None and not is_protected(element):
+            element.drop_tree()
+    # 블록 사이 글자가 붙지 않게 블록의 시작과 끝에만 공백을 넣고,
+    # 줄바꿈, 탭, nbsp 등 모든 공백을 한 번에 공백 하나로 바꿉니다.
+    for element in root.iter(*BLOCK_TAGS):
+        element.text = " " + (element.text or "")
+        element.tail = " " + (element.tail or "")
+    return " ".join("".join(root.itertext()).split())
+
+
+def extract_text(html):
+    """HTML 에서 본문 text 만 뽑습니다. 주석만 있는 문서처럼 읽을 수 없으면 "" 를 돌려줍니다."""
+    if not html.strip():
+        return ""
+    if isinstance(html, str):
+        # lxml 은 encoding 선언이 있는 str 을 받지 않습니다. 이미 decode 된 str 이므로 선언만 지웁니다.
+        html = XML_DECLARATION.sub("", html, count=1)
+    try:
+        root = lxml.html.fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        # 주석만 있거나 본문이 없는 문서입니다.
+        return ""
+    return clean_text(root)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import httpx
+import numpy as np
+from langchain.adapters.openai import convert_dict_to_message, convert_message_to_dict
+from langchain.chat_models import ChatOpenAI
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.schema import ChatGeneration, ChatResult
+from sqlitedict import SqliteDict
+
+CACHE_PATH = "./.cache/llm_responses.sqlite"
+# off: 사용하지 않음, auto: cache 에 없을 때만 호출, record: 항상 호출해서 다시 기록,
+# replay: cache 에 있는 응답만 사용하고 네트워크를 부르지 않음 ( 개발, benchmark 용 )
+# embedding 은 record 에서 기록하고 replay 에서만 cache 를 씁니다.
+MODE = os.environ.get("LLM_CACHE_MODE", "auto")
+MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 50000))
+LOW_WATERMARK = 0.9  # 한도를 넘으면 한도의 90% 까지 오래 안 쓴 응답을 지웁니다.
+
+# langchain 0.0.332 의 ChatOpenAI 는 request_timeout 의 httpx 타입을 TYPE_CHECKING 에서만 import 해서
+# request_timeout 을 넘기면 pydantic 검증이 실패합니다. 아래 subclass 를 만들기 전에 풀어 둡니다.
+ChatOpenAI.update_forward_refs(httpx=httpx)
+
+
+class LLMCacheMiss(Exception):
+    pass
+
+
+class ResponseCache:
+    """(model, temperature, prompt hash) 로 찾는 LLM 응답 cache 입니다.
+
+    응답과 마지막 사용 시각을 같은 sqlite 파일의 두 table 에 두고, max_entries 를
+    넘으면 가장 오래 쓰지 않은 응답부터 지웁니다.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self.responses = SqliteDict(path, tablename="responses", autocommit=True, timeout=30)
+        self.accessed = SqliteDict(path, tablename="accessed", autocommit=True, timeout=30)
+        self.evict_lock = threading.Lock()
+
+    def key(self, model, temperature, prompt):
+        prompt_hash = hashlib.sha256(
+            json.dumps(prompt, sort_keys=True, ensure_ascii=False).encode()
+        ).hexdigest()
+        return f"{model}|{temperature}|{prompt_hash}"
+
+    def get(self, key):
+        value = self.responses.get(key)
+        if value is not None:
+            self.accessed[key] = time.time()
+        return value
+
+    def put(self, key, value):
+        self.responses[key] = value
+        self.accessed[key] = time.time()
+        if len(self.responses) > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        with self.evict_lock:
+            count = len(self.responses) - int(self.max_entries * LOW_WATERMARK)
+            if count <= 0:
+                return
+            oldest = sorted(self.accessed.items(), key=lambda item: item[1])[:count]
+            for key, _ in oldest:
+                self.responses.pop(key, None)
+                self.accessed.pop(key, None)
+
+
+response_cache = None
+response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    # sqlite 파일은 처음 쓸 때 열고 모든 세션이 함께 씁니다.
+    global response_cache
+    with response_cache_lock:
+        if response_cache is None:
+            response_cache = ResponseCache()
+        return response_cache
+
+
+class CachedChatOpenAI(ChatOpenAI):
+    """같은 prompt 의 응답을 cache 에서 돌려주는 ChatOpenAI 입니다.
+
+    streaming 중이면 cache 에 있던 응답을 token 하나로 callback 에 넘겨, 화면에
+    답을 그리는 handler 가 그대로 동작하게 합니다.
+    """
+
+    def _generate(self, messages, stop=None, run_manager=None, stream=None, **kwargs):
+        if MODE == "off":
+            return super()._generate(messages, stop, run_manager, stream, **kwargs)
+        cache = get_response_cache()
+        key = cache.key(
+            self.model_name,
+            self.temperature,
+            {
+                "messages": [convert_message_to_dict(message) for message in messages],
+                "stop": stop,
+                "n": self.n,
+                "max_tokens": self.max_tokens,
+                "model_kwargs": self.model_kwargs,
+                "kwargs": kwargs,
+            },
+        )
+        cached = cache.get(key) if MODE != "record" else None
+        if cached is not None:
+            if run_manager and (stream if stream is not None else self.streaming):
+                for generation in cached:
+                    run_manager.on_llm_new_token(generation["message"].get("content") or "")
+            return ChatResult(
+                generations=[
+                    ChatGeneration(
+                        message=convert_dict_to_message(generation["message"]),
+                        generation_info=generation["generation_info"],
+                    )
+                    for generation in cached
+                ]
+            )
+        if MODE == "replay":
+            raise LLMCacheMiss(f"No recorded response for {key}")
+        result = super()._generate(messages, stop, run_manager, stream, **kwargs)
+        cache.put(
+            key,
+            [
+                {
+                    "message": convert_message_to_dict(generation.message),
+                    "generation_info": generation.generation_info,
+                }
+                for generation in result.generations
+            ],
+        )
+        return result
+
+
+class CachedOpenAIEmbeddings(OpenAIEmbeddings):
+    """record 모드에서 embedding 을 기록하고, replay 모드에서는 기록한 값만 돌려주는 OpenAIEmbeddings 입니다.
+
+    off, auto 모드에서는 그대로 호출합니다. 문서 embedding 은 CacheBackedEmbeddings 가 이미
+    디스크에 저장하므로 같은 벡터를 두 번 저장하지 않습니다.
+    """
+
+    def embed_documents(self, texts, chunk_size=0):
+        if MODE not in ("record", "replay"):
+            return super().embed_documents(texts, chunk_size)
+        cache = get_response_cache()
+        keys = [cache.key(self.model, "embedding", text) for text in texts]
+        if MODE == "replay":
+            vectors = [cache.get(key) for key in keys]
+            missing = [key for key, vector in zip(keys, vectors) if vector is None]
+            if missing:
+                raise LLMCacheMiss(f"No recorded embedding for {missing[0]}")
+            return [np.frombuffer(vector, dtype=np.float32).tolist() for vector in vectors]
+        vectors = super().embed_documents(texts, chunk_size)
+        for key, vector in zip(keys, vectors):
+            cache.put(key, np.asarray(vector, dtype=np.float32).tobytes())
+        return vectors
+
+    def embed_query(self, text):
+        if MODE not in ("record", "replay"):
+            return super().embed_query(text)
+        return self.embed_documents([text])[0]
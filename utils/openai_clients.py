@@ -0,0 +1,144 @@
+import hashlib
+import threading
+
+import openai
+import requests
+
+from utils.llm_cache import MODE as LLM_CACHE_MODE, CachedChatOpenAI, CachedOpenAIEmbeddings
+from utils.rate_limiter import BULK, INTERACTIVE, QueueFull, Scheduler
+
+POOL_SIZE = 16  # api key 하나에 유지할 keep-alive 연결 수
+
+
+def key_name(authorization):
+    return hashlib.sha256(authorization.encode()).hexdigest()[:8]
+
+
+def estimate_tokens(data):
+    # 요청 본문 4 글자를 토큰 하나로 어림합니다.
+    return max(len(data or b"") // 4, 1)
+
+
+class PooledSession(requests.Session):
+    """api key 마다 keep-alive 연결 pool 을 따로 두고 프로세스 전체가 함께 쓰는 session 입니다.
+
+    openai 0.28 은 thread 마다 session 을 새로 만들기 때문에, streamlit 이 rerun 마다
+    새 thread 를 쓰면 요청마다 TLS 연결을 다시 맺게 됩니다.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE):
+        super().__init__()
+        self.pool_size = pool_size
+        self.pools = {}
+        self.requests_count = {}
+        self.lock = threading.Lock()
+
+    def pool(self, name):
+        with self.lock:
+            if name not in self.pools:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=self.pool_size,
+                    max_retries=2,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.pools[name] = session
+                self.requests_count[name] = 0
+            self.requests_count[name] += 1
+            return self.pools[name]
+
+    def request(self, method, url, headers=None, data=None, **kwargs):
+        # key 자체는 남기지 않도록 Authorization 헤더의 hash 로 pool 을 나눕니다.
+        authorization = (headers or {}).get("Authorization", "")
+        name = key_name(authorization)
+        # embedding 은 한꺼번에 많이 보내므로, 사용자가 기다리는 채팅 호출을 먼저 보냅니다.
+        priority = BULK if url.rstrip("/").endswith("/embeddings") else INTERACTIVE
+        try:
+            scheduler.acquire(name, priority, estimate_tokens(data))
+        except QueueFull as e:
+            # langchain 과 openai 가 RateLimitError 를 받으면 잠시 뒤에 다시 시도합니다.
+            raise openai.error.RateLimitError(f"Too many requests are waiting: {e}")
+        return self.pool(name).request(method, url, headers=headers, data=data, **kwargs)
+
+    def close(self):
+        # openai 는 180초마다 thread 의 session 을 close 하므로, 공유 pool 은 닫지 않습니다.
+        pass
+
+    def stats(self):
+        with self.lock:
+            pools = list(self.pools.items())
+        rows = []
+        for name, session in pools:
+            connection_pools = session.get_adapter("https://").poolmanager.pools
+            keys = connection_pools.keys()
+            opened = sum(connection_pools[key].num_connections for key in keys)
+            # urllib3 는 빈 자리를 None 으로 채워 두므로 실제 연결만 셉니다.
+            idle = sum(
+                1 for key in keys for connection in connection_pools[key].pool.queue if connection
+            )
+            rows.append(
+                {
+                    "pool": name,
+                    "requests": self.requests_count[name],
+                    "connections opened": opened,
+                    "idle connections": idle,
+                }
+            )
+        return rows
+
+
+scheduler = Scheduler()
+session = PooledSession()
+clients = {}
+clients_lock = threading.Lock()
+
+
+class OpenAIClient:
+    """세션마다 쓰는 client 입니다. openai.api_key 같은 module 전역 값을 건드리지 않습니다."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def check(self):
+        # replay 모드에서는 네트워크를 부르지 않으므로 key 를 확인하지 않습니다.
+        if LLM_CACHE_MODE == "replay":
+            return True
+        try:
+            openai.Model.list(api_key=self.api_key)
+            return True
+        except openai.error.AuthenticationError:
+            return False
+
+    def chat(self, **kwargs):
+        # 같은 prompt 는 LLM_CACHE_MODE 에 따라 저장해 둔 응답을 다시 씁니다.
+        return CachedChatOpenAI(openai_api_key=self.api_key, **kwargs)
+
+    def embeddings(self, **kwargs):
+        return CachedOpenAIEmbeddings(openai_api_key=self.api_key, **kwargs)
+
+    def chat_completion(self, **kwargs):
+        return openai.ChatCompletion.create(api_key=self.api_key, **kwargs)
+
+
+def get_client(api_key):
+    # 처음 client 를 만들 때 openai 가 공유 pool 을 쓰도록 연결합니다.
+    with clients_lock:
+        openai.requestssession = session
+        if api_key not in clients:
+            clients[api_key] = OpenAIClient(api_key)
+        return clients[api_key]
+
+
+def pool_stats():
+    return session.stats()
+
+
+def queue_stats():
+    return scheduler.stats()
+
+
+def is_busy(api_key, threshold=0.5):
+    """이 key 의 대기열이 threshold 이상 찼으면 True 입니다. 화면에 대기 안내를 띄울 때 씁니다."""
+    return scheduler.load(key_name(f"Bearer {api_key}")) >= threshold
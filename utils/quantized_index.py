@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.embeddings.cache import _create_key_encoder
+from langchain.storage.encoder_backed import EncoderBackedStore
+from langchain.vectorstores.faiss import FAISS, dependable_faiss_import
+
+# float32 ( 기존 방식 ), float16, int8, pq 중 하나입니다.
+STORAGE = os.environ.get("VECTOR_STORAGE", "float32")
+STORAGES = ("float32", "float16", "int8", "pq")
+PQ_SUBVECTOR_DIMS = 16  # PQ 에서 code 1 byte 가 맡는 차원 수 ( 1536 차원이면 96 byte )
+PQ_MIN_TRAIN = 256  # 이보다 chunk 가 적으면 PQ codebook 을 학습할 수 없어 int8 로 저장합니다.
+RERANK_FACTOR = 8  # 양자화된 색인에서 k 의 몇 배를 뽑아 원래 벡터로 다시 정렬할지
+
+
+def serialize_float32(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def deserialize_float32(data):
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+def serialize_float16(vector):
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+
+def deserialize_float16(data):
+    return np.frombuffer(data, dtype=np.float16).astype(np.float32).tolist()
+
+
+def serialize_int8(vector):
+    # 벡터마다 최대 절댓값을 scale 로 두고 -127 ~ 127 로 나눕니다.
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = max(float(np.abs(vector).max()), 1e-12) / 127
+    codes = np.round(vector / scale).astype(np.int8)
+    return np.float32(scale).tobytes() + codes.tobytes()
+
+
+def deserialize_int8(data):
+    scale = np.frombuffer(data[:4], dtype=np.float32)[0]
+    return (np.frombuffer(data[4:], dtype=np.int8) * scale).tolist()
+
+
+# pq 는 다시 정렬할 때 원래 벡터가 필요하므로 embedding cache 는 float32 ( JSON 이 아닌 binary ) 로 둡니다.
+SERIALIZERS = {
+    "pq": (serialize_float32, deserialize_float32),
+    "float16": (serialize_float16, deserialize_float16),
+    "int8": (serialize_int8, deserialize_int8),
+}
+
+
+def cached_embeddings(embeddings, store, namespace, storage=STORAGE):
+    """storage 에 맞는 형식으로 embedding 을 저장하는 CacheBackedEmbeddings 를 만듭니다.
+
+    형식마다 namespace 를 나누어, 저장 방식을 바꿔도 다른 형식의 값을 읽지 않게 합니다.
+    """
+    if storage not in SERIALIZERS:
+        return CacheBackedEmbeddings.from_bytes_store(embeddings, store, namespace=namespace)
+    serializer, deserializer = SERIALIZERS[storage]
+    return CacheBackedEmbeddings(
+        embeddings,
+        EncoderBackedStore(
+            store, _create_key_encoder(f"{namespace}-{storage}"), serializer, deserializer
+        ),
+    )
+
+
+def make_index(vectors, storage=STORAGE):
+    """storage 에 맞는 faiss 색인을 만들고 vectors 로 학습합니다."""
+    faiss = dependable_faiss_import()
+    dim = vectors.shape[1]
+    if storage == "pq" and len(vectors) >= PQ_MIN_TRAIN and dim % PQ_SUBVECTOR_DIMS == 0:
+        index = faiss.IndexPQ(dim, dim // PQ_SUBVECTOR_DIMS, 8)
+    elif storage in ("pq", "int8"):
+        # 학습한 벡터 범위 밖의 값이 잘리지 않도록 모든 차원에 같은 범위를 씁니다.
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit_uniform)
+    elif storage == "float16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+    else:
+        index = faiss.IndexFlatL2(dim)
+    if not index.is_trained:
+        index.train(vectors)
+    return index
+
+
+class QuantizedFAISS(FAISS):
+    """양자화된 색인에서 후보를 넉넉히 뽑고 원래 벡터로 거리를 다시 계산해 정렬합니다.
+
+    원래 벡터는 메모리에 두지 않고 CacheBackedEmbeddings 의 디스크 cache 에서 읽습니다.
+    cache 에 없는 후보는 양자화된 거리를 그대로 씁니다.
+    """
+
+    def similarity_search_with_score_by_vector(
+        self, embedding, k=4, filter=None, fetch_k=20, **kwargs
+    ):
+        faiss = dependable_faiss_import()
+        if isinstance(self.index, faiss.IndexFlat):
+            return super().similarity_search_with_score_by_vector(
+                embedding, k, filter, fetch_k, **kwargs
+            )
+        candidates = super().similarity_search_with_score_by_vector(
+            embedding, k * RERANK_FACTOR, filter, max(fetch_k, k * RERANK_FACTOR), **kwargs
+        )
+        store = getattr(self.embedding_function, "document_embedding_store", None)
+        if store is None or not candidates:
+            return candidates[:k]
+        query = np.asarray(embedding, dtype=np.float32)
+        vectors = store.mget([doc.page_content for doc, _ in candidates])
+        reranked = [
+            (doc, score if vector is None else float(np.sum((np.asarray(vector) - query) ** 2)))
+            for (doc, score), vector in zip(candidates, vectors)
+        ]
+        reranked.sort(key=lambda pair: pair[1])
+        return reranked[:k]
+
+
+def from_documents(docs, embeddings, storage=STORAGE):
+    """FAISS.from_documents 와 같지만 storage 에 맞는 색인에 넣습니다."""
+    texts = [doc.page_content for doc in docs]
+    vectors = embeddings.embed_documents(texts)
+    vector_store = QuantizedFAISS(
+        embeddings,
+        make_index(np.array(vectors, dtype=np.float32), storage),
+        InMemoryDocstore(),
+        {},
+    )
+    vector_store.add_embeddings(
+        zip(texts, vectors), metadatas=[doc.metadata for doc in docs]
+    )
+    return vector_store
+
+
+def code_bytes(index):
+    # 벡터 하나가 색인에서 차지하는 byte 수입니다. ( float32 이면 d * 4 )
+    return getattr(index, "code_size", index.d * 4)
@@ -0,0 +1,131 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+
+INTERACTIVE = 0  # 채팅처럼 사용자가 기다리는 호출
+BULK = 1  # 파일, 사이트 embedding 처럼 한꺼번에 많이 보내는 호출
+
+REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_RPM", 500))
+TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TPM", 200000))
+MAX_QUEUE = int(os.environ.get("OPENAI_MAX_QUEUE", 64))
+BURST_SECONDS = float(os.environ.get("OPENAI_BURST_SECONDS", 1))  # 한 번에 몰아 보낼 수 있는 양(초 단위)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst_seconds):
+        self.rate = per_minute / 60
+        self.capacity = max(self.rate * burst_seconds, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        # capacity 보다 큰 요청은 bucket 이 가득 찼을 때 보내고, 모자란 만큼은 take 에서 빚으로 남깁니다.
+        self.refill()
+        amount = min(amount, self.capacity)
+        return 0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        # 전체 양을 빼서 bucket 이 음수가 되면, 다음 요청은 빚을 갚을 때까지 기다립니다.
+        self.tokens -= amount
+
+
+class KeyQueue:
+    def __init__(self, requests_per_minute, tokens_per_minute, burst_seconds):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self.waiting = []
+        self.depth = {INTERACTIVE: 0, BULK: 0}
+        self.metrics = {"granted": 0, "rejected": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+
+class Scheduler:
+    """API key 마다 token bucket 으로 요청 수와 토큰 수를 제한하는 요청 대기열입니다.
+
+    요청은 우선순위(INTERACTIVE 가 BULK 보다 먼저), 들어온 순서대로 나갑니다.
+    대기열이 가득 차면 QueueFull 을 일으켜 호출하는 쪽이 물러나게 합니다.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        tokens_per_minute=TOKENS_PER_MINUTE,
+        max_queue=MAX_QUEUE,
+        burst_seconds=BURST_SECONDS,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.burst_seconds = burst_seconds
+        self.queues = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def queue(self, key):
+        if key not in self.queues:
+            self.queues[key] = KeyQueue(
+                self.requests_per_minute, self.tokens_per_minute, self.burst_seconds
+            )
+        return self.queues[key]
+
+    def acquire(self, key, priority, tokens):
+        """차례가 오고 bucket 에 여유가 생길 때까지 기다린 뒤, 기다린 시간을 돌려줍니다."""
+        start = time.monotonic()
+        with self.condition:
+            queue = self.queue(key)
+            if len(queue.waiting) >= self.max_queue:
+                queue.metrics["rejected"] += 1
+                raise QueueFull(f"{len(queue.waiting)} requests are already waiting")
+            ticket = (priority, next(self.counter))
+            heapq.heappush(queue.waiting, ticket)
+            queue.depth[priority] += 1
+            while True:
+                if queue.waiting[0] == ticket:
+                    delay = max(queue.requests.time_until(1), queue.tokens.time_until(tokens))
+                    if delay == 0:
+                        break
+                    self.condition.wait(delay)
+                else:
+                    self.condition.wait()
+            heapq.heappop(queue.waiting)
+            queue.depth[priority] -= 1
+            queue.requests.take(1)
+            queue.tokens.take(tokens)
+            waited = time.monotonic() - start
+            queue.metrics["granted"] += 1
+            queue.metrics["total_wait"] += waited
+            queue.metrics["max_wait"] = max(queue.metrics["max_wait"], waited)
+            self.condition.notify_all()
+        return waited
+
+    def load(self, key):
+        """대기열이 얼마나 찼는지 0 에서 1 사이 값으로 돌려줍니다."""
+        with self.condition:
+            return len(self.queue(key).waiting) / self.max_queue
+
+    def stats(self):
+        with self.condition:
+            return [
+                {
+                    "pool": key,
+                    "interactive waiting": queue.depth[INTERACTIVE],
+                    "bulk waiting": queue.depth[BULK],
+                    "granted": queue.metrics["granted"],
+                    "rejected": queue.metrics["rejected"],
+                    "avg wait (s)": round(
+                        queue.metrics["total_wait"] / max(queue.metrics["granted"], 1), 3
+                    ),
+                    "max wait (s)": round(queue.metrics["max_wait"], 3),
+                }
+                for key, queue in self.queues.items()
+            ]
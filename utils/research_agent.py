@@ -0,0 +1,140 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import openai
+
+from utils.research_tools import MAX_OUTPUT_CHARS, TOOLS, tool_specs
+
+MODEL = "gpt-4-1106-preview"
+TIME_BUDGET = 120  # 한 번의 research 에 쓸 수 있는 시간(초)
+TOKEN_BUDGET = 30000  # 한 번의 research 에 쓸 수 있는 토큰 수
+MAX_CONCURRENCY = 4  # 한 번의 응답에서 나온 tool 호출을 동시에 실행할 수
+
+SYSTEM_MESSAGE = """
+You are a research expert.
+Your task is to use Wikipedia or DuckDuckGo to gather comprehensive and accurate information about the query provided.
+When you find a relevant website through DuckDuckGo, scrape the content from that website.
+Call independent tools in the same turn so they can run at the same time.
+Ensure the final result contains detailed information, all relevant sources, and citations.
+"""
+
+
+def run_tool(tools, name, arguments):
+    if name not in tools:
+        return f"Unknown tool: {name}"
+    schema, _, function = tools[name]
+    try:
+        args = schema(**json.loads(arguments or "{}"))
+        return str(function(**args.dict()))[:MAX_OUTPUT_CHARS]
+    except Exception as e:
+        # 실패한 tool 도 결과로 돌려주어 모델이 다른 방법을 찾게 합니다.
+        return f"Error: {e}"
+
+
+def run_tool_calls(tools, tool_calls, timeout):
+    """한 번의 응답에서 나온 tool 호출들을 동시에 실행합니다.
+
+    시간 안에 끝나지 않은 호출은 기다리지 않고 시간 초과로 답합니다.
+    """
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+    futures = {
+        executor.submit(
+            run_tool, tools, call["function"]["name"], call["function"]["arguments"]
+        ): call["id"]
+        for call in tool_calls
+    }
+    wait(futures, timeout=max(timeout, 0))
+    executor.shutdown(wait=False, cancel_futures=True)
+    return [
+        {
+            "role": "tool",
+            "tool_call_id": call_id,
+            "content": future.result() if future.done() else "Error: the tool timed out.",
+        }
+        for future, call_id in futures.items()
+    ]
+
+
+def estimate_tokens(*parts):
+    # stream 응답에는 usage 가 없으므로 글자 수로 토큰 수를 어림합니다.
+    return sum(len(json.dumps(part, ensure_ascii=False)) for part in parts) // 4
+
+
+def stream_completion(create, handler, **kwargs):
+    """stream 으로 받은 응답에서 본문과 tool 호출을 모읍니다.
+
+    본문 토큰은 받는 대로 handler.on_token 에 넘깁니다.
+    """
+    content = ""
+    tool_calls = {}
+    response = create(stream=True, **kwargs)
+    try:
+        for chunk in response:
+            if not chunk["choices"]:
+                continue
+            delta = chunk["choices"][0].get("delta", {})
+            if delta.get("content"):
+                content += delta["content"]
+                if handler:
+                    handler.on_token(delta["content"])
+            # tool 호출은 이름과 인자가 조각으로 나뉘어 오므로 index 별로 이어 붙입니다.
+            for call in delta.get("tool_calls") or []:
+                entry = tool_calls.setdefault(
+                    call["index"],
+                    {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                entry["id"] = call.get("id") or entry["id"]
+                function = call.get("function") or {}
+                entry["function"]["name"] += function.get("name") or ""
+                entry["function"]["arguments"] += function.get("arguments") or ""
+    finally:
+        # rerun 으로 멈추거나 오류가 나면 남은 stream 을 닫아 연결을 돌려줍니다.
+        if hasattr(response, "close"):
+            response.close()
+    return content, [tool_calls[i] for i in sorted(tool_calls)]
+
+
+def run_research(
+    query,
+    api_key,
+    tools=TOOLS,
+    model=MODEL,
+    time_budget=TIME_BUDGET,
+    token_budget=TOKEN_BUDGET,
+    create=openai.ChatCompletion.create,
+    handler=None,
+):
+    """모델이 요청한 tool 을 실행하며 research 결과를 만듭니다.
+
+    시간이나 토큰 예산을 다 쓰면 tool 없이 지금까지 모은 내용으로 답하게 합니다.
+    handler 는 on_token(token) 과 on_tool_calls(tool_calls) 를 받습니다. create 에
+    가짜 함수를 넘기면 OpenAI 없이 시험할 수 있습니다.
+    """
+    deadline = time.monotonic() + time_budget
+    used_tokens = 0
+    messages = [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": query},
+    ]
+    while True:
+        over_budget = used_tokens >= token_budget or time.monotonic() >= deadline
+        options = {"tool_choice": "none"} if over_budget else {}
+        content, tool_calls = stream_completion(
+            create,
+            handler,
+            model=model,
+            messages=messages,
+            tools=tool_specs(tools),
+            api_key=api_key,
+            **options,
+        )
+        used_tokens += estimate_tokens(messages, content, tool_calls)
+        if over_budget or not tool_calls:
+            return content
+        if handler:
+            handler.on_tool_calls(tool_calls)
+        messages.append({"role": "assistant", "content": content or None, "tool_calls": tool_calls})
+        messages.extend(
+            run_tool_calls(tools, tool_calls, timeout=deadline - time.monotonic())
+        )
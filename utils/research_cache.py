@@ -0,0 +1,30 @@
+import hashlib
+
+from utils.cache_manager import cache
+
+CACHE_DIR = "./.cache/research"
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def query_path(query, model):
+    key = hashlib.sha256(f"{model}\n{normalize_query(query)}".encode()).hexdigest()
+    return f"{CACHE_DIR}/queries/{key}"
+
+
+def get_cached_result(query, model):
+    content_hash = cache.read_text(query_path(query, model))
+    if content_hash is None:
+        return None
+    return cache.read_text(f"{CACHE_DIR}/results/{content_hash}.txt")
+
+
+def put_cached_result(query, model, result):
+    # 결과는 내용의 hash 로 한 번만 저장하고, 질문에서는 그 hash 만 가리킵니다.
+    content_hash = hashlib.sha256(result.encode()).hexdigest()
+    result_path = f"{CACHE_DIR}/results/{content_hash}.txt"
+    if not cache.lookup(result_path):
+        cache.write(result_path, result)
+    cache.write(query_path(query, model), content_hash)
@@ -0,0 +1,105 @@
+from itertools import islice
+
+from pydantic import BaseModel, Field
+
+from utils.scraper import scrape
+
+MAX_RESULTS = 5
+MAX_OUTPUT_CHARS = 4000  # tool 결과가 prompt 를 너무 키우지 않도록 자릅니다.
+
+
+class DuckDuckGoSearchToolArgsSchema(BaseModel):
+    query: str = Field(description="The query you will search for")
+
+
+class WikipediaSearchToolArgsSchema(BaseModel):
+    query: str = Field(description="The query you will search for on Wikipedia")
+
+
+class WebScrapingToolArgsSchema(BaseModel):
+    url: str = Field(description="The URL of the website you want to scrape")
+
+
+class SaveToTXTToolArgsSchema(BaseModel):
+    text: str = Field(description="The text you will save to a file.")
+
+
+def duckduckgo_search(query):
+    from duckduckgo_search import DDGS
+
+    with DDGS() as ddgs:
+        results = list(islice(ddgs.text(query), MAX_RESULTS))
+    return "\n\n".join(
+        f"{result['title']}\n{result['href']}\n{result['body']}" for result in results
+    )
+
+
+def wikipedia_search(query):
+    import wikipedia
+
+    summaries = []
+    for title in wikipedia.search(query, results=MAX_RESULTS)[:2]:
+        try:
+            page = wikipedia.page(title, auto_suggest=False)
+        except (wikipedia.DisambiguationError, wikipedia.PageError):
+            continue
+        summaries.append(f"{page.title}\n{page.url}\n{page.summary}")
+    return "\n\n".join(summaries)
+
+
+def scrape_website(url):
+    return scrape(url)
+
+
+# tool 이름: (인자 schema, 설명, 실행 함수)
+# 결과를 저장하는 save_to_txt 는 research 마다 buffer 가 필요하므로 make_tools 로만 만듭니다.
+TOOLS = {
+    "duckduckgo_search": (
+        DuckDuckGoSearchToolArgsSchema,
+        "Use this tool to find websites for the query. Returns titles, URLs and snippets.",
+        duckduckgo_search,
+    ),
+    "wikipedia_search": (
+        WikipediaSearchToolArgsSchema,
+        "Use this tool to find Wikipedia articles for the query. Returns their summaries.",
+        wikipedia_search,
+    ),
+    "scrape_website": (
+        WebScrapingToolArgsSchema,
+        "Use this tool to read the text content of a website found with DuckDuckGo.",
+        scrape_website,
+    ),
+}
+
+
+def make_tools(results_buffer):
+    """TOOLS 에 research 마다 만든 buffer(io.StringIO)에 쓰는 save_to_txt 를 더한 tool 목록입니다."""
+
+    def save_to_buffer(text):
+        results_buffer.seek(0)
+        results_buffer.truncate()
+        results_buffer.write(text)
+        return "Research results saved."
+
+    return {
+        **TOOLS,
+        "save_to_txt": (
+            SaveToTXTToolArgsSchema,
+            "Use this tool to save the final research result to a text file.",
+            save_to_buffer,
+        ),
+    }
+
+
+def tool_specs(tools=TOOLS):
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": schema.schema(),
+            },
+        }
+        for name, (schema, description, _) in tools.items()
+    ]
@@ -0,0 +1,117 @@
+import hashlib
+import ipaddress
+import socket
+import threading
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+import lxml.etree
+import lxml.html
+
+from utils.cache_manager import cache
+from utils.html_text import clean_text
+
+CACHE_DIR = "./.cache/scrape"
+CACHE_TTL = 60 * 60 * 24  # 같은 URL 은 하루 동안 다시 받지 않습니다.
+MAX_BYTES = 2 * 2**20  # 이보다 큰 응답은 앞부분만 읽습니다.
+CONCURRENCY_PER_HOST = 2
+MAX_REDIRECTS = 5
+
+# 모든 세션이 하나의 client 를 공유해 keep-alive 연결을 재사용합니다.
+# redirect 는 대상 주소를 확인한 뒤 직접 따라갑니다.
+client = httpx.Client(
+    timeout=20,
+    follow_redirects=False,
+    headers={"User-Agent": "AssistantGPT"},
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+)
+host_semaphores = {}
+host_semaphores_lock = threading.Lock()
+
+
+def host_semaphore(url):
+    host = urlsplit(url).netloc
+    with host_semaphores_lock:
+        return host_semaphores.setdefault(
+            host, threading.BoundedSemaphore(CONCURRENCY_PER_HOST)
+        )
+
+
+def cache_path(url):
+    return f"{CACHE_DIR}/{hashlib.sha256(url.encode()).hexdigest()}.txt"
+
+
+def read_cache(url):
+    return cache.read_text(cache_path(url), ttl=CACHE_TTL)
+
+
+def write_cache(url, text):
+    cache.write(cache_path(url), text)
+
+
+def check_url(url):
+    """모델이 고른 URL 이 서버 내부나 사설망을 가리키면 ValueError 를 일으킵니다.
+
+    검색 결과나 scraping 한 페이지의 내용이 모델에게 내부 주소를 읽게 할 수 있기 때문입니다.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Only http and https URLs can be scraped: {url}")
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or 80, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ValueError(f"Cannot resolve {parts.hostname}: {e}")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        # loopback, 사설망, link-local ( 169.254.169.254 등 ), 예약 대역을 모두 막습니다.
+        if not address.is_global:
+            raise ValueError(f"Refusing to scrape a non-public address: {url}")
+
+
+def open_stream(url):
+    # redirect 마다 새 주소를 확인해, 공개 주소에서 내부 주소로 넘기는 것도 막습니다.
+    for _ in range(MAX_REDIRECTS + 1):
+        check_url(url)
+        response = client.send(client.build_request("GET", url), stream=True)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers["Location"])
+    raise ValueError(f"Too many redirects: {url}")
+
+
+def fetch_text(url):
+    with host_semaphore(url), open_stream(url) as response:
+        response.raise_for_status()
+        if "html" not in response.headers.get("content-type", "html"):
+            return b"".join(read_limited(response)).decode(errors="ignore")
+        # 받는 대로 parser 에 넣어, 다운로드와 parsing 을 겹치고 큰 페이지는 잘라냅니다.
+        parser = lxml.html.HTMLParser(encoding=response.encoding or "utf-8")
+        for chunk in read_limited(response):
+            parser.feed(chunk)
+        try:
+            root = parser.close()
+        except lxml.etree.XMLSyntaxError:
+            # 본문이 비어 있으면 parser 가 문서를 만들지 못합니다.
+            return ""
+    return "" if root is None else clean_text(root)
+
+
+def read_limited(response):
+    # MAX_BYTES 까지만 받고 나머지는 내려받지 않습니다.
+    received = 0
+    for chunk in response.iter_bytes():
+        yield chunk[: MAX_BYTES - received]
+        received += len(chunk)
+        if received >= MAX_BYTES:
+            break
+
+
+def scrape(url):
+    text = read_cache(url)
+    if text is None:
+        text = fetch_text(url)
+        write_cache(url, text)
+    return text
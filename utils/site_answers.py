@@ -0,0 +1,51 @@
+import math
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+MAX_CONCURRENCY = 4  # 동시에 실행할 map 단계 LLM 호출 수
+MAP_TIMEOUT = 20  # 호출 하나에 허용하는 시간(초)
+
+
+def map_answers(
+    answers_chain,
+    question,
+    docs,
+    max_concurrency=MAX_CONCURRENCY,
+    timeout=MAP_TIMEOUT,
+    on_answer=None,
+):
+    """문서마다 answers_chain 을 동시에 실행하고 시간 안에 끝난 답을 돌려줍니다.
+
+    돌려주는 list 는 docs 와 같은 순서이고, 실패했거나 시간 안에 끝나지 않은
+    자리는 None 입니다. on_answer 는 답이 하나 끝날 때마다 호출하는 쪽 thread
+    에서 불립니다.
+    """
+    if not docs:
+        return []
+    # 동시에 max_concurrency 개씩 실행되므로 전체 마감 시간은 호출 묶음 수만큼 늘립니다.
+    deadline = timeout * math.ceil(len(docs) / max_concurrency)
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    futures = {
+        executor.submit(
+            answers_chain.invoke, {"question": question, "context": doc.page_content}
+        ): i
+        for i, doc in enumerate(docs)
+    }
+    results = {}
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            if future.exception() is not None:
+                continue
+            i = futures[future]
+            results[i] = {
+                "answer": future.result().content,
+                "source": docs[i].metadata["source"],
+                "date": docs[i].metadata["lastmod"],
+            }
+            if on_answer:
+                on_answer(len(results), len(docs))
+    except TimeoutError:
+        # 늦은 호출은 기다리지 않고, 끝난 답만으로 다음 단계를 진행합니다.
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [results.get(i) for i in range(len(docs))]
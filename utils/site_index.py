@@ -0,0 +1,98 @@
+import copy
+import os
+import pickle
+import shutil
+
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores.faiss import dependable_faiss_import
+
+from utils import quantized_index
+from utils.cache_manager import CachedFileStore
+from utils.quantized_index import QuantizedFAISS
+
+INDEX_DIR = "./.cache/site_index"
+EMBEDDINGS_DIR = "./.cache/embeddings/site"
+
+
+def cached_embeddings(embeddings):
+    # chunk 내용의 hash 로 찾기 때문에 내용이 같은 chunk 는 다시 embedding 하지 않습니다.
+    return quantized_index.cached_embeddings(
+        embeddings, CachedFileStore(EMBEDDINGS_DIR), namespace=embeddings.model
+    )
+
+
+class NoEmbeddings(Embeddings):
+    # 여러 세션이 함께 쓰는 색인에는 특정 세션의 API key 를 남기지 않습니다.
+    def embed_documents(self, texts):
+        raise RuntimeError("Shared site index has no embeddings, use with_embeddings().")
+
+    def embed_query(self, text):
+        raise RuntimeError("Shared site index has no embeddings, use with_embeddings().")
+
+
+def with_embeddings(vector_store, embeddings):
+    """색인은 그대로 공유하고 질문 embedding 만 호출한 세션의 client 로 하는 얕은 복사본입니다."""
+    vector_store = copy.copy(vector_store)
+    vector_store.embedding_function = cached_embeddings(embeddings)
+    return vector_store
+
+
+def save_index(vector_store, index_path):
+    # 다른 세션이나 프로세스가 mmap 으로 열어 둔 파일을 덮어쓰지 않도록 새 파일로 바꿔 넣습니다.
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    vector_store.save_local(tmp_path)
+    os.makedirs(index_path, exist_ok=True)
+    for filename in os.listdir(tmp_path):
+        os.replace(f"{tmp_path}/{filename}", f"{index_path}/{filename}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def remove_pages(vector_store, urls):
+    ids = [
+        doc_id
+        for doc_id in vector_store.index_to_docstore_id.values()
+        if vector_store.docstore.search(doc_id).metadata["source"] in urls
+    ]
+    if ids:
+        vector_store.delete(ids)
+
+
+def update_site_index(name, store, changed, removed, embeddings):
+    """저장해 둔 색인에서 바뀐 페이지의 chunk 만 지우고 다시 넣습니다.
+
+    색인이 아직 없을 때만 store 의 모든 chunk 로 새로 만듭니다.
+    """
+    index_path = f"{INDEX_DIR}/{name}"
+    embeddings = cached_embeddings(embeddings)
+    if not os.path.exists(index_path):
+        docs = store.documents()
+        if not docs:
+            raise ValueError("No pages in the sitemap matched filter_urls, nothing to index.")
+        vector_store = quantized_index.from_documents(docs, embeddings)
+        save_index(vector_store, index_path)
+        return vector_store
+    vector_store = QuantizedFAISS.load_local(index_path, embeddings)
+    if changed or removed:
+        remove_pages(vector_store, set(changed) | set(removed))
+        if changed:
+            vector_store.add_documents(store.documents(changed))
+        save_index(vector_store, index_path)
+    return vector_store
+
+
+def load_index(name):
+    """저장해 둔 색인을 memory mapping 으로 읽기 전용으로 엽니다.
+
+    IO_FLAG_MMAP_IFC ( faiss 1.10 이상, requirements.txt 에 고정 ) 로 벡터 ( 양자화했으면
+    code ) 를 mmap 해서 색인 크기만큼 메모리를 읽어 들이지 않습니다. mmap 으로 연 색인에
+    벡터를 넣거나 지우면 faiss 가 프로세스를 멈추므로, 색인 갱신은 update_site_index 에서만
+    합니다. 질문 embedding 은 with_embeddings 로 세션마다 붙입니다.
+    """
+    index_path = f"{INDEX_DIR}/{name}"
+    faiss = dependable_faiss_import()
+    index = faiss.read_index(
+        f"{index_path}/index.faiss", faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    )
+    with open(f"{index_path}/index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return QuantizedFAISS(NoEmbeddings(), index, docstore, index_to_docstore_id)
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from utils.crawl_store import site_key
+from utils.quantized_index import code_bytes
+from utils.site_index import load_index, with_embeddings
+
+SITES_PATH = "./sites.json"
+
+
+def load_sites(path=SITES_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return {site["name"]: site for site in json.load(f)}
+
+
+def index_bytes(vector_store):
+    # faiss 벡터 ( 양자화했으면 code ) 와 chunk 본문 크기로 메모리 사용량을 어림합니다.
+    index = vector_store.index
+    text_bytes = sum(
+        len(doc.page_content.encode()) for doc in vector_store.docstore._dict.values()
+    )
+    return index.ntotal * code_bytes(index) + text_bytes
+
+
+class SiteRegistry:
+    """여러 문서 사이트의 색인을 필요할 때 열고, 메모리 한도를 넘으면 오래 안 쓴 색인부터 닫습니다.
+
+    refresh(site, embeddings) 는 사이트의 색인을 디스크에 최신 상태로 만드는 함수입니다. 프로세스에서
+    사이트마다 한 번만 부르고, 그 뒤로는 디스크의 색인을 다시 엽니다.
+
+    메모리에 둔 색인에는 embedding 함수를 두지 않고, get() 이 호출한 세션의 embeddings 를
+    붙인 얕은 복사본을 돌려줍니다. 사이트를 여는 동안에는 그 사이트의 lock 만 잡으므로
+    다른 사이트를 쓰는 세션은 기다리지 않습니다.
+    """
+
+    def __init__(self, sites, refresh, max_bytes):
+        self.sites = sites
+        self.refresh = refresh
+        self.max_bytes = max_bytes
+        self.resident = OrderedDict()
+        self.refreshed = set()
+        # self.lock 은 resident, metrics 를 바꿀 때만 잡고, crawl 과 색인 읽기는 사이트별 lock 으로 막습니다.
+        self.lock = threading.Lock()
+        self.site_locks = {name: threading.Lock() for name in sites}
+        self.metrics = {
+            name: {"loads": 0, "hits": 0, "evictions": 0, "load_seconds": 0.0}
+            for name in sites
+        }
+
+    def get(self, name, embeddings):
+        vector_store = self.lookup(name)
+        if vector_store is None:
+            with self.site_locks[name]:
+                # 기다리는 동안 다른 세션이 이미 열었을 수 있습니다.
+                vector_store = self.lookup(name) or self.load(name, embeddings)
+        return with_embeddings(vector_store, embeddings)
+
+    def lookup(self, name):
+        with self.lock:
+            if name not in self.resident:
+                return None
+            self.resident.move_to_end(name)
+            self.metrics[name]["hits"] += 1
+            return self.resident[name][0]
+
+    def load(self, name, embeddings):
+        start = time.perf_counter()
+        site = self.sites[name]
+        if name not in self.refreshed:
+            # 처음 crawl 하고 embedding 하는 비용은 사이트를 처음 연 세션의 key 로 냅니다.
+            self.refresh(site, embeddings)
+            self.refreshed.add(name)
+        vector_store = load_index(site_key(site["sitemap"]))
+        size = index_bytes(vector_store)
+        with self.lock:
+            self.resident[name] = (vector_store, size)
+            self.metrics[name]["loads"] += 1
+            self.metrics[name]["load_seconds"] = time.perf_counter() - start
+            self.evict(keep=name)
+        return vector_store
+
+    def evict(self, keep):
+        while self.resident_bytes() > self.max_bytes and len(self.resident) > 1:
+            name = next(iter(self.resident))
+            if name == keep:
+                break
+            del self.resident[name]
+            self.metrics[name]["evictions"] += 1
+
+    def resident_bytes(self):
+        return sum(size for _, size in self.resident.values())
+
+    def stats(self):
+        return [
+            {
+                "site": name,
+                "resident": name in self.resident,
+                "MB": round(self.resident[name][1] / 2**20, 1) if name in self.resident else 0,
+                **metrics,
+            }
+            for name, metrics in self.metrics.items()
+        ]
@@ -0,0 +1,51 @@
+import re
+
+FETCH_K = 8  # 점수를 보고 고를 후보 chunk 수
+MAX_K = 4  # map 단계로 보낼 최대 chunk 수 ( 예전 retriever 의 기본값 )
+SCORE_THRESHOLD = 0.6  # 이보다 관련도 점수가 낮은 chunk 는 보내지 않습니다.
+SCORE_MARGIN = 0.15  # 가장 높은 점수와 이만큼 넘게 차이 나는 chunk 는 보내지 않습니다.
+MIN_OVERLAP = 0.2  # 질문 단어 중 chunk 에 나오는 비율이 이보다 낮으면 보내지 않습니다.
+
+STOP_WORDS = {
+    "the", "and", "for", "are", "was", "what", "which", "who", "how", "why", "when",
+    "where", "does", "can", "with", "this", "that", "from", "you", "your", "about",
+    "use", "into", "there", "their", "have", "has", "not", "but", "all", "any",
+}
+
+
+def words(text):
+    return {
+        word
+        for word in re.findall(r"\w+", text.lower())
+        if len(word) > 2 and word not in STOP_WORDS
+    }
+
+
+def lexical_overlap(question_words, text):
+    if not question_words:
+        return 1.0
+    return len(question_words & words(text)) / len(question_words)
+
+
+def retrieve(vector_store, question):
+    """관련도 점수와 단어 겹침으로 map 단계에 보낼 chunk 만 고릅니다.
+
+    (docs, skipped) 를 돌려줍니다. skipped 는 예전처럼 상위 MAX_K 개를 모두 보냈을 때와
+    비교해 줄어든 map 호출 수입니다.
+    """
+    results = vector_store.similarity_search_with_relevance_scores(question, k=FETCH_K)
+    if not results:
+        return [], 0
+    best = max(score for _, score in results)
+    question_words = words(question)
+    docs = []
+    for rank, (doc, score) in enumerate(results):
+        if score < SCORE_THRESHOLD or score < best - SCORE_MARGIN:
+            continue
+        # 가장 관련도가 높은 chunk 는 단어가 겹치지 않아도 남겨 둡니다.
+        if rank > 0 and lexical_overlap(question_words, doc.page_content) < MIN_OVERLAP:
+            continue
+        docs.append(doc)
+        if len(docs) == MAX_K:
+            break
+    return docs, min(len(results), MAX_K) - len(docs)
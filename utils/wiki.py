@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import os
+
+import httpx
+from langchain.schema import Document
+
+from utils.cache_manager import cache
+
+# 테스트할 때는 WIKIPEDIA_API_URL 환경변수로 로컬 서버를 가리키게 할 수 있습니다.
+WIKIPEDIA_API_URL = os.environ.get(
+    "WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php"
+)
+CACHE_DIR = "./.cache/wikipedia"
+SEARCH_TTL = 60 * 60 * 24  # 검색 결과는 하루 동안 재사용합니다.
+DOC_CONTENT_CHARS_MAX = 4000  # WikipediaRetriever 의 기본값과 같습니다.
+
+
+def normalize_term(term):
+    return " ".join(term.lower().split())
+
+
+async def search_pages(client, api_url, term, top_k):
+    response = await client.get(
+        api_url,
+        params={
+            "action": "query",
+            "format": "json",
+            "generator": "search",
+            "gsrsearch": term,
+            "gsrlimit": top_k,
+            "prop": "info",
+        },
+    )
+    response.raise_for_status()
+    pages = response.json().get("query", {}).get("pages", {}).values()
+    return [
+        {"pageid": page["pageid"], "title": page["title"], "revid": page["lastrevid"]}
+        for page in sorted(pages, key=lambda page: page.get("index", 0))
+    ]
+
+
+async def fetch_page(client, api_url, page):
+    # 같은 revision 의 내용은 바뀌지 않으므로 TTL 없이 보관합니다.
+    path = f"{CACHE_DIR}/pages/{page['pageid']}-{page['revid']}.json"
+    cached = cache.read_json(path)
+    if cached is not None:
+        return cached
+    response = await client.get(
+        api_url,
+        params={
+            "action": "query",
+            "format": "json",
+            "prop": "extracts",
+            "explaintext": 1,
+            "pageids": page["pageid"],
+        },
+    )
+    response.raise_for_status()
+    extract = response.json()["query"]["pages"][str(page["pageid"])].get("extract", "")
+    data = {**page, "content": extract}
+    cache.write_json(path, data)
+    return data
+
+
+async def fetch_pages(term, top_k, api_url):
+    async with httpx.AsyncClient(timeout=30) as client:
+        key = hashlib.sha256(normalize_term(term).encode()).hexdigest()
+        search_path = f"{CACHE_DIR}/search/{key}-{top_k}.json"
+        pages = cache.read_json(search_path, ttl=SEARCH_TTL)
+        if pages is None:
+            pages = await search_pages(client, api_url, term, top_k)
+            cache.write_json(search_path, pages)
+        return await asyncio.gather(
+            *[fetch_page(client, api_url, page) for page in pages]
+        )
+
+
+def search_wikipedia(term, top_k=5, api_url=WIKIPEDIA_API_URL):
+    pages = asyncio.run(fetch_pages(term, top_k, api_url))
+    return [
+        Document(
+            page_content=page["content"][:DOC_CONTENT_CHARS_MAX],
+            metadata={
+                "title": page["title"],
+                "source": f"https://en.wikipedia.org/?curid={page['pageid']}",
+                "revid": page["revid"],
+            },
+        )
+        for page in pages
+    ]